@@ -1,12 +1,14 @@
 import os
 import math
 import streamlit as st
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from db import Base, engine, SessionLocal
-from models import User, Place, Rating, Comment, Bookmark
-from utils import seed_places_if_empty, hash_password, check_password, display_price
-from recommender import RecommenderService
+from db import Base, engine, SessionLocal, add_missing_columns
+from models import User, Rating, Comment, Bookmark
+from utils import (seed_places_if_empty, hash_password, check_password, display_price, load_places_page,
+                   upsert_rating, repair_rating_aggregates)
+from recommender import RecommenderReloader, RecommendationCache
+from search import ensure_search_index, search_places, PlaceSearchIndex
 
 # ========= [RAG ADDON] =========
 from rag.config import RAGSettings
@@ -18,24 +20,101 @@ st.set_page_config(page_title="EcoTourism Recsys (Streamlit)", page_icon="🌿",
 
 # Bootstrap DB
 Base.metadata.create_all(bind=engine)
+_added_cols = add_missing_columns(engine)
 with SessionLocal() as sess:
     seed_places_if_empty(sess)
+    if "places.rating_count" in _added_cols:
+        repair_rating_aggregates(sess)  # DB lama: isi agregat rating sekali
+
+# Index pencarian tempat (FTS5 / pg_trgm+tsvector), dibuat sekali per proses
+@st.cache_resource(show_spinner=False)
+def _init_search_backend():
+    return ensure_search_index(engine)
+
+SEARCH_BACKEND = _init_search_backend()
 
 # Load recommender artefak
 BASE_DIR = os.getcwd()
 cbf_dir = os.path.join(BASE_DIR, "models", "cbf")
 cf_dir  = os.path.join(BASE_DIR, "models", "cf")
 data_dir= os.path.join(BASE_DIR, "data")
-try:
-    RECS = RecommenderService(
+
+# Service dimuat sekali per proses & dibagi antar sesi; artefak baru di-swap otomatis tanpa restart
+@st.cache_resource(show_spinner=True)
+def _get_recs_reloader():
+    return RecommenderReloader(
+        check_interval=float(os.environ.get("ARTIFACT_CHECK_INTERVAL", 5)),
         cbf_dir=os.environ.get("CBF_DIR", cbf_dir),
         cf_dir=os.environ.get("CF_DIR", cf_dir),
         fallback_data_dir=data_dir,
+        cbf_top_n=int(os.environ["CBF_TOP_N"]) if os.environ.get("CBF_TOP_N") else None,
+        cf_mmap=os.environ.get("CF_MMAP", "0") == "1",
+        cf_float32=os.environ.get("CF_FLOAT32", "0") == "1",
+        cf_sparse=os.environ.get("CF_SPARSE", "0") == "1",
     )
+
+try:
+    RECS_RELOADER = _get_recs_reloader()
+    RECS_VERSION = RECS_RELOADER.version  # dibaca sebelum get(): reload di antaranya → versi berbeda di rerun berikut
+    RECS = RECS_RELOADER.get()
+    if RECS_RELOADER.last_error:
+        st.sidebar.warning(f"Reload artefak gagal, memakai model lama: {RECS_RELOADER.last_error}")
 except Exception as e:
     st.sidebar.error(f"Gagal load artefak: {e}")
+    RECS_RELOADER = None
+    RECS_VERSION = None
     RECS = None
 
+# Cache rekomendasi per user (dibagi antar rerun/sesi dalam satu proses)
+@st.cache_resource(show_spinner=False)
+def _get_rec_cache():
+    return RecommendationCache(
+        maxsize=int(os.environ.get("REC_CACHE_SIZE", 256)),
+        ttl=float(os.environ.get("REC_CACHE_TTL", 600)),
+    )
+
+REC_CACHE = _get_rec_cache()
+
+# Tanpa FTS di DB (fallback ILIKE) → pakai inverted index in-memory dari katalog tempat service
+@st.cache_resource(show_spinner=False)
+def _get_search_index():
+    return PlaceSearchIndex()
+
+SEARCH_INDEX = None
+if SEARCH_BACKEND == "ilike" and RECS is not None and os.environ.get("SEARCH_MEMORY_INDEX", "1") == "1":
+    SEARCH_INDEX = _get_search_index()
+    # no-op jika versi model sama dengan sync terakhir; hanya baris berubah yang di-index ulang
+    SEARCH_INDEX.sync_frame(RECS.places_df, version=RECS_VERSION)
+    SEARCH_BACKEND = "memory"
+
+# CF inkremental: rating live dari DB → refresh kemiripan item yang berubah saja
+CF_INCREMENTAL = os.environ.get("CF_INCREMENTAL", "1") == "1"
+
+# Sync penuh sekali per versi model (bukan per rerun); setelah itu hanya delta dari handler rating
+@st.cache_resource(show_spinner=False)
+def _cf_bootstrap(_svc, model_version):
+    try:
+        with SessionLocal() as sess:
+            live_ratings = sess.execute(select(Rating.user_id, Rating.place_id, Rating.rating)).all()
+        _svc.sync_cf_ratings(live_ratings)
+        return ""
+    except Exception as e:
+        return str(e)
+
+def _cf_apply(user_id, ratings):
+    """Terapkan rating yang baru disimpan ke CF inkremental: ratings = [(place_id, rating), ...]."""
+    if RECS is None or not CF_INCREMENTAL:
+        return
+    try:
+        RECS.apply_cf_ratings([(user_id, int(pid), float(r)) for pid, r in ratings])
+    except Exception as e:
+        st.sidebar.warning(f"CF inkremental dilewati: {e}")
+
+if RECS is not None and CF_INCREMENTAL:
+    _cf_err = _cf_bootstrap(RECS, RECS_RELOADER.version)
+    if _cf_err:
+        st.sidebar.warning(f"CF inkremental dilewati: {_cf_err}")
+
 # ======== [RAG ADDON] init + PRE-INGEST CSV (cached) ========
 DEFAULT_BOOTSTRAP_CSV = "/mnt/d/Projek/Freelancer/cl9_fw - Mentoring build System Recommender (DONE)/streamlit_recsys/models/cbf/places_clean.csv"
 
@@ -54,6 +133,9 @@ class _DummyIndex:
     def ingest_paths(self, *args, **kwargs):
         raise RuntimeError(self._err)
 
+    def sync_paths(self, *args, **kwargs):
+        raise RuntimeError(self._err)
+
     def retrieve(self, *args, **kwargs):
         raise RuntimeError(self._err)
 
@@ -83,22 +165,22 @@ def _init_rag_with_bootstrap():
     # 3) Pre-ingest file CSV “di belakang”
     bootstrap_csv = os.environ.get("RAG_BOOTSTRAP_CSV", DEFAULT_BOOTSTRAP_CSV)
     bootstrap_csv = bootstrap_csv.strip('"').strip("'") if bootstrap_csv else ""
-    ingest_report = {"path": bootstrap_csv, "skipped": False, "ingested": 0, "reason": ""}
+    ingest_report = {"path": bootstrap_csv, "skipped": False, "ingested": 0, "deleted": 0, "reason": ""}
 
     if bootstrap_csv and os.path.exists(bootstrap_csv):
-        base = os.path.basename(bootstrap_csv)
         try:
-            if hasattr(idx, "has_source") and idx.has_source(base):
+            # sync inkremental: hanya baris baru/berubah yang di-embed, baris yang hilang dihapus
+            stats = idx.sync_paths([bootstrap_csv], tags="bootstrap:places_clean")
+            ingest_report["ingested"] = int(stats["upserted"])
+            ingest_report["deleted"] = int(stats["deleted"])
+            if not stats["upserted"] and not stats["deleted"]:
                 ingest_report["skipped"] = True
-                ingest_report["reason"] = "sudah terindeks"
-            else:
-                try:
-                    n = idx.ingest_paths([bootstrap_csv], tags="bootstrap:places_clean")
-                    ingest_report["ingested"] = int(n)
-                except Exception as e:
-                    ingest_report["reason"] = f"gagal ingest: {e}"
+                ingest_report["reason"] = "sudah terindeks (tidak ada perubahan)"
         except Exception as e:
-            ingest_report["reason"] = f"index not ready: {e or create_err}"
+            if isinstance(idx, _DummyIndex):
+                ingest_report["reason"] = f"index not ready: {e or create_err}"
+            else:
+                ingest_report["reason"] = f"gagal ingest: {e}"
     else:
         ingest_report["reason"] = "file tidak ditemukan"
 
@@ -117,6 +199,107 @@ def login_user(u: User):
 def logout_user():
     st.session_state.pop("user", None)
 
+# ====== Grid kartu tempat (Populer & Home AI) ======
+def render_place_grid(df, key_prefix: str):
+    """Render grid 3 kolom; semua data kartu dimuat sekali per halaman via load_places_page."""
+    user_logged = get_sess_user()
+    pids = [int(df.iloc[i].get("id", df.iloc[i].get("place_id", -1))) for i in range(len(df))]
+    with SessionLocal() as sess:
+        # komentar hanya tampil untuk user login → anonim tidak perlu query Comment⨝User
+        page_data = load_places_page(sess, [pid for pid in pids if pid >= 0],
+                                     user_id=user_logged["id"] if user_logged else None,
+                                     with_comments=user_logged is not None)
+
+    for i in range(0, len(df), 3):
+        cols = st.columns(3)
+        for j, col in enumerate(cols):
+            if i + j >= len(df):
+                continue
+            r = df.iloc[i + j]
+            pid = pids[i + j]
+            if pid < 0:
+                continue
+
+            card = page_data.get(pid, {})
+            p = card.get("place")
+
+            with col:
+                with st.container(border=True):
+                    if p and p.image:
+                        st.image(p.image, width="stretch")
+
+                    name = (p.place_name if p else r.get("place_name", "")) or ""
+                    city = (p.city if p else r.get("city", "")) or "-"
+                    cat  = (p.category if p else r.get("category", "")) or "-"
+                    price_text = card.get("price_text", "-") if p else display_price(r.get("price", ""), 0.0)
+                    rating_val = float((p.rating_avg if p else r.get("rating", 0.0)) or 0.0)
+
+                    st.markdown(f"### {name}")
+                    st.caption(f"{city} • {cat}")
+                    st.write(f"Harga: **{price_text}**")
+                    st.write(f"Rating rata-rata: **{rating_val:.1f}**")
+
+                    if p and p.map_url:
+                        st.link_button("🌍 Map", p.map_url, width="content")
+
+                    if p and (p.place_description or "").strip():
+                        with st.expander("Detail"):
+                            st.write(p.place_description)
+
+                    if user_logged:
+                        # Bookmark
+                        if st.button("🔖 Bookmark", key=f"{key_prefix}_bm_{pid}", width="content"):
+                            if not card.get("bookmarked"):
+                                with SessionLocal() as sess:
+                                    if not sess.query(Bookmark).filter_by(user_id=user_logged["id"], place_id=pid).first():
+                                        sess.add(Bookmark(user_id=user_logged["id"], place_id=pid))
+                                        sess.commit()
+                            st.success("Ditambahkan ke bookmark")
+
+                        # Rating
+                        my_r = card.get("my_rating") or 0.0
+                        new_rating = st.slider(
+                            "Beri rating",
+                            min_value=1, max_value=5,
+                            value=int(my_r) if my_r else 5,
+                            key=f"{key_prefix}_rate_{pid}"
+                        )
+                        if st.button("Simpan Rating", key=f"{key_prefix}_save_{pid}", width="content"):
+                            with SessionLocal() as sess:
+                                upsert_rating(sess, user_logged["id"], pid, new_rating)
+                            _cf_apply(user_logged["id"], [(pid, new_rating)])
+                            REC_CACHE.invalidate_user(user_logged["id"])
+                            st.success("Rating tersimpan.")
+                            st.rerun()
+
+                        # Comments
+                        st.markdown("**Komentar**")
+                        comment_text = st.text_input(
+                            "Tulis komentar…",
+                            key=f"{key_prefix}_c_{pid}",
+                            label_visibility="collapsed",
+                            placeholder="Tulis komentar…"
+                        )
+                        if st.button("Kirim Komentar", key=f"{key_prefix}_send_{pid}", width="content"):
+                            ct = (comment_text or "").strip()
+                            if ct:
+                                with SessionLocal() as sess:
+                                    sess.add(Comment(user_id=user_logged["id"], place_id=pid, text=ct))
+                                    sess.commit()
+                                st.success("Komentar terkirim")
+                                st.rerun()
+
+                        # Show recent comments
+                        cr = card.get("comments") or []
+                        if cr:
+                            for c, user in cr:
+                                st.write(f"- *{user.name}* • {c.created_at}: {c.text}")
+                        else:
+                            st.caption("_Belum ada komentar_")
+                    else:
+                        st.info("Login untuk memberi rating, komentar, dan bookmark.")
+
+
 # Flag tampilan chatbot di main page
 if "show_chatbot" not in st.session_state:
     st.session_state["show_chatbot"] = True  # langsung tampil chatbot saat start
@@ -209,116 +392,7 @@ else:
             top_k = st.selectbox("Tampilkan", options=[6, 9, 12, 24, 48], index=2, key="popular_k")
             df = RECS.top_rated(k=int(top_k))
             st.caption("Anda dapat memberi rating, komentar, bookmark, melihat deskripsi & peta langsung di sini.")
-            for i in range(0, len(df), 3):
-                cols = st.columns(3)
-                for j, col in enumerate(cols):
-                    if i + j >= len(df):
-                        continue
-                    r = df.iloc[i + j]
-                    pid = int(r.get("id", r.get("place_id", -1)))
-                    if pid < 0:
-                        continue
-
-                    # Load entitas lengkap untuk deskripsi/map
-                    with SessionLocal() as sess:
-                        p = sess.get(Place, pid)
-
-                    with col:
-                        with st.container(border=True):
-                            if p and p.image:
-                                st.image(p.image, width="stretch")
-
-                            name = (p.place_name if p else r.get("place_name", "")) or ""
-                            city = (p.city if p else r.get("city", "")) or "-"
-                            cat  = (p.category if p else r.get("category", "")) or "-"
-                            price_text = display_price(p.price_str if p else r.get("price", ""), p.price_num if p else 0.0)
-                            rating_val = float((p.rating_avg if p else r.get("rating", 0.0)) or 0.0)
-
-                            st.markdown(f"### {name}")
-                            st.caption(f"{city} • {cat}")
-                            st.write(f"Harga: **{price_text}**")
-                            st.write(f"Rating rata-rata: **{rating_val:.1f}**")
-
-                            if p and p.map_url:
-                                st.link_button("🌍 Map", p.map_url, width="content")
-
-                            if p and (p.place_description or "").strip():
-                                with st.expander("Detail"):
-                                    st.write(p.place_description)
-
-                            user_logged = get_sess_user()
-                            if user_logged:
-                                # Bookmark
-                                if st.button("🔖 Bookmark", key=f"pop_bm_{pid}", width="content"):
-                                    with SessionLocal() as sess:
-                                        if not sess.query(Bookmark).filter_by(user_id=user_logged["id"], place_id=pid).first():
-                                            sess.add(Bookmark(user_id=user_logged["id"], place_id=pid))
-                                            sess.commit()
-                                    st.success("Ditambahkan ke bookmark")
-
-                                # Rating
-                                with SessionLocal() as sess:
-                                    my_r = 0.0
-                                    rr = sess.query(Rating).filter_by(user_id=user_logged["id"], place_id=pid).first()
-                                    if rr:
-                                        my_r = float(rr.rating)
-
-                                new_rating = st.slider(
-                                    "Beri rating",
-                                    min_value=1, max_value=5,
-                                    value=int(my_r) if my_r else 5,
-                                    key=f"pop_rate_{pid}"
-                                )
-                                if st.button("Simpan Rating", key=f"pop_save_{pid}", width="content"):
-                                    with SessionLocal() as sess:
-                                        rrow = sess.query(Rating).filter_by(user_id=user_logged["id"], place_id=pid).first()
-                                        if rrow:
-                                            rrow.rating = float(new_rating)
-                                        else:
-                                            sess.add(Rating(user_id=user_logged["id"], place_id=pid, rating=float(new_rating)))
-                                        sess.commit()
-                                        # Update place avg
-                                        avg, cnt = sess.query(func.avg(Rating.rating), func.count(Rating.id))\
-                                                       .filter(Rating.place_id == pid).first()
-                                        if p:
-                                            p.rating_avg = float(avg or 0.0)
-                                            sess.commit()
-                                    st.success("Rating tersimpan.")
-                                    st.rerun()
-
-                                # Comments
-                                st.markdown("**Komentar**")
-                                comment_text = st.text_input(
-                                    "Tulis komentar…",
-                                    key=f"pop_c_{pid}",
-                                    label_visibility="collapsed",
-                                    placeholder="Tulis komentar…"
-                                )
-                                if st.button("Kirim Komentar", key=f"pop_send_{pid}", width="content"):
-                                    ct = (comment_text or "").strip()
-                                    if ct:
-                                        with SessionLocal() as sess:
-                                            sess.add(Comment(user_id=user_logged["id"], place_id=pid, text=ct))
-                                            sess.commit()
-                                        st.success("Komentar terkirim")
-                                        st.rerun()
-
-                                # Show recent comments
-                                with SessionLocal() as sess:
-                                    cr = (
-                                        sess.query(Comment, User)
-                                        .join(User, Comment.user_id == User.id)
-                                        .filter(Comment.place_id == pid)
-                                        .order_by(Comment.created_at.desc())
-                                        .all()
-                                    )
-                                if cr:
-                                    for c, user in cr:
-                                        st.write(f"- *{user.name}* • {c.created_at}: {c.text}")
-                                else:
-                                    st.caption("_Belum ada komentar_")
-                            else:
-                                st.info("Login untuk memberi rating, komentar, dan bookmark.")
+            render_place_grid(df, key_prefix="pop")
 
     # ------------- Tab Home (AI) — PAGINATION + Interaktif -------------
     with tab_home:
@@ -337,17 +411,17 @@ else:
             if not user_ratings:
                 st.warning("Belum ada preferensi. Buka tab 'Cari Tempat' lalu beri rating, atau gunakan menu Onboarding di bawah.")
             else:
-                total_items = len(RECS.item_ids) if getattr(RECS, "item_ids", None) is not None else 0
-                if total_items <= 1:
-                    total_items = 50  # fallback
-
                 alpha = float(os.environ.get("HYBRID_ALPHA", 0.6))
-                try:
-                    recdf = RECS.recommend_hybrid_for_user(user_ratings, k=total_items, alpha=alpha)
-                except Exception:
-                    recdf = RECS.recommend_hybrid_for_user(user_ratings, k=max(1, total_items - 1), alpha=alpha)
 
-                if recdf is None or len(recdf) == 0:
+                # Vektor skor di-cache per user; tiap halaman cukup argpartition + metadata item yang tampil
+                scores = REC_CACHE.get_or_compute(
+                    u["id"], user_ratings,
+                    lambda: RECS.score_hybrid_for_user(user_ratings, alpha=alpha),
+                    alpha=alpha, model=RECS_RELOADER.version,
+                )
+                total = RECS.candidate_count(scores)
+
+                if total == 0:
                     st.info("Tidak ada rekomendasi yang bisa dihitung.")
                 else:
                     # State pagination (jangan set untuk key widget)
@@ -367,7 +441,6 @@ else:
                             key="home_ai_page_size",
                         )
 
-                    total = len(recdf)
                     total_pages = max(1, math.ceil(total / page_size))
 
                     # clamp page jika page_size berubah
@@ -396,122 +469,14 @@ else:
                         )
                         st.caption("Anda dapat memberi rating & komentar langsung di sini.")
 
-                    # Slice current page
+                    # Ambil hanya item halaman aktif
                     start = (page - 1) * page_size
                     end = min(start + page_size, total)
-                    page_df = recdf.iloc[start:end]
+                    page_df, _ = RECS.recommend_page(user_ratings, offset=start, limit=end - start,
+                                                     alpha=alpha, scores=scores)
 
                     # Render grid (3 kolom)
-                    for i in range(0, len(page_df), 3):
-                        cols = st.columns(3)
-                        for j, col in enumerate(cols):
-                            if i + j >= len(page_df):
-                                continue
-                            r = page_df.iloc[i + j]
-                            pid = int(r.get("id", r.get("place_id", -1)))
-                            if pid < 0:
-                                continue
-
-                            # Muat row Place lengkap
-                            with SessionLocal() as sess:
-                                p = sess.get(Place, pid)
-
-                            with col:
-                                with st.container(border=True):
-                                    if p and p.image:
-                                        st.image(p.image, width="stretch")
-
-                                    name = (p.place_name if p else r.get("place_name", "")) or ""
-                                    city = (p.city if p else r.get("city", "")) or "-"
-                                    cat  = (p.category if p else r.get("category", "")) or "-"
-                                    price_text = display_price(p.price_str if p else r.get("price", ""),
-                                                               p.price_num if p else 0.0)
-                                    rating_val = float((p.rating_avg if p else r.get("rating", 0.0)) or 0.0)
-
-                                    st.markdown(f"### {name}")
-                                    st.caption(f"{city} • {cat}")
-                                    st.write(f"Harga: **{price_text}**")
-                                    st.write(f"Rating rata-rata: **{rating_val:.1f}**")
-
-                                    if p and p.map_url:
-                                        st.link_button("🌍 Map", p.map_url, width="content")
-
-                                    if p and (p.place_description or "").strip():
-                                        with st.expander("Detail"):
-                                            st.write(p.place_description)
-
-                                    user_logged = get_sess_user()
-                                    if user_logged:
-                                        # Bookmark
-                                        if st.button("🔖 Bookmark", key=f"home_bm_{pid}", width="content"):
-                                            with SessionLocal() as sess:
-                                                if not sess.query(Bookmark).filter_by(user_id=user_logged["id"], place_id=pid).first():
-                                                    sess.add(Bookmark(user_id=user_logged["id"], place_id=pid))
-                                                    sess.commit()
-                                            st.success("Ditambahkan ke bookmark")
-
-                                        # Rating
-                                        with SessionLocal() as sess:
-                                            my_r = 0.0
-                                            rr = sess.query(Rating).filter_by(user_id=user_logged["id"], place_id=pid).first()
-                                            if rr:
-                                                my_r = float(rr.rating)
-
-                                        new_rating = st.slider(
-                                            "Beri rating",
-                                            min_value=1, max_value=5,
-                                            value=int(my_r) if my_r else 5,
-                                            key=f"home_rate_{pid}"
-                                        )
-                                        if st.button("Simpan Rating", key=f"home_save_{pid}", width="content"):
-                                            with SessionLocal() as sess:
-                                                rrow = sess.query(Rating).filter_by(user_id=user_logged["id"], place_id=pid).first()
-                                                if rrow:
-                                                    rrow.rating = float(new_rating)
-                                                else:
-                                                    sess.add(Rating(user_id=user_logged["id"], place_id=pid, rating=float(new_rating)))
-                                                sess.commit()
-                                                # Update place's avg
-                                                avg, cnt = sess.query(func.avg(Rating.rating), func.count(Rating.id)).filter(Rating.place_id == pid).first()
-                                                if p:
-                                                    p.rating_avg = float(avg or 0.0)
-                                                    sess.commit()
-                                            st.success("Rating tersimpan.")
-                                            st.rerun()
-
-                                        # Comments
-                                        st.markdown("**Komentar**")
-                                        comment_text = st.text_input(
-                                            "Tulis komentar…",
-                                            key=f"home_c_{pid}",
-                                            label_visibility="collapsed",
-                                            placeholder="Tulis komentar…"
-                                        )
-                                        if st.button("Kirim Komentar", key=f"home_send_{pid}", width="content"):
-                                            ct = (comment_text or "").strip()
-                                            if ct:
-                                                with SessionLocal() as sess:
-                                                    sess.add(Comment(user_id=user_logged["id"], place_id=pid, text=ct))
-                                                    sess.commit()
-                                                st.success("Komentar terkirim")
-                                                st.rerun()
-
-                                        # Show recent comments
-                                        with SessionLocal() as sess:
-                                            cr = (
-                                                sess.query(Comment, User)
-                                                .join(User, Comment.user_id == User.id)
-                                                .filter(Comment.place_id == pid)
-                                                .order_by(Comment.created_at.desc())
-                                                .all()
-                                            )
-                                        if cr:
-                                            for c, user in cr:
-                                                st.write(f"- *{user.name}* • {c.created_at}: {c.text}")
-                                        else:
-                                            st.caption("_Belum ada komentar_")
-                                    else:
-                                        st.info("Login untuk memberi rating, komentar, dan bookmark.")
+                    render_place_grid(page_df, key_prefix="home")
 
         st.caption("Anda juga bisa membuka tab 'Cari Tempat' untuk memberi rating pada item lain dan memicu rekomendasi ulang.")
 
@@ -522,15 +487,32 @@ else:
         cat = st.text_input("Kategori")
         limit = st.slider("Limit", 6, 60, 18, 6)
 
+        # Keyset pagination: simpan stack cursor per kombinasi pencarian
+        search_sig = (q.strip(), city.strip(), cat.strip(), int(limit))
+        if st.session_state.get("search_sig") != search_sig:
+            st.session_state["search_sig"] = search_sig
+            st.session_state["search_cursors"] = [None]
+        cursors = st.session_state["search_cursors"]
+
         with SessionLocal() as sess:
-            query = sess.query(Place)
-            if q:
-                query = query.filter(Place.place_name.ilike(f"%{q.strip()}%"))
-            if city:
-                query = query.filter(Place.city.ilike(f"%{city.strip()}%"))
-            if cat:
-                query = query.filter(Place.category.ilike(f"%{cat.strip()}%"))
-            rows = query.limit(limit).all()
+            rows, next_cursor = search_places(sess, q=q, city=city, category=cat, limit=limit,
+                                              cursor=cursors[-1], backend=SEARCH_BACKEND,
+                                              memory_index=SEARCH_INDEX)
+            u = get_sess_user()
+            page_data = load_places_page(sess, [p.id for p in rows], user_id=u["id"] if u else None,
+                                         with_comments=u is not None)
+
+        nav = st.columns([2, 2, 6])
+        with nav[0]:
+            if st.button("◀ Sebelumnya", disabled=len(cursors) <= 1, key="search_prev", width="content"):
+                cursors.pop()
+                st.rerun()
+        with nav[1]:
+            if st.button("Berikutnya ▶", disabled=next_cursor is None, key="search_next", width="content"):
+                cursors.append(next_cursor)
+                st.rerun()
+        with nav[2]:
+            st.caption(f"Halaman {len(cursors)} • index: {SEARCH_BACKEND}")
 
         st.write(f"Menampilkan {len(rows)} tempat.")
         for p in rows:
@@ -542,11 +524,9 @@ else:
                 with cols[1]:
                     st.markdown(f"### {p.place_name}")
                     st.caption(f"{p.city or '-'} • {p.category or '-'}")
-                    st.write(f"Harga: **{display_price(p.price_str, p.price_num)}**")
-                    with SessionLocal() as sess:
-                        avg, cnt = sess.query(func.avg(Rating.rating), func.count(Rating.id)).filter(Rating.place_id == p.id).first()
-                        avg = float(avg or 0.0); cnt = int(cnt or 0)
-                    st.write(f"Rating rata-rata: **{avg:.1f}** ({cnt} rating)")
+                    card = page_data.get(p.id, {})
+                    st.write(f"Harga: **{card.get('price_text', '-')}**")
+                    st.write(f"Rating rata-rata: **{card.get('rating_avg', 0.0):.1f}** ({card.get('rating_count', 0)} rating)")
                     if p.place_description:
                         st.write(p.place_description)
 
@@ -563,20 +543,13 @@ else:
                             st.success("Ditambahkan ke bookmark")
 
                         # Rating
-                        my_r = 0.0
-                        with SessionLocal() as sess:
-                            r = sess.query(Rating).filter_by(user_id=u["id"], place_id=p.id).first()
-                            if r: my_r = float(r.rating)
+                        my_r = card.get("my_rating") or 0.0
                         new_rating = st.slider("Beri rating", 1, 5, int(my_r) if my_r else 5, key=f"rate_{p.id}")
                         if st.button(f"Simpan Rating {p.id}", key=f"save_{p.id}", width="content"):
                             with SessionLocal() as sess:
-                                r = sess.query(Rating).filter_by(user_id=u["id"], place_id=p.id).first()
-                                if r: r.rating = float(new_rating)
-                                else: sess.add(Rating(user_id=u["id"], place_id=p.id, rating=float(new_rating)))
-                                sess.commit()
-                                avg, cnt = sess.query(func.avg(Rating.rating), func.count(Rating.id)).filter(Rating.place_id == p.id).first()
-                                p.rating_avg = float(avg or 0.0)
-                                sess.commit()
+                                upsert_rating(sess, u["id"], p.id, new_rating)
+                            _cf_apply(u["id"], [(p.id, new_rating)])
+                            REC_CACHE.invalidate_user(u["id"])
                             st.success("Rating tersimpan. Rekomendasi akan berubah setelah Anda memberi beberapa rating.")
                             st.rerun()
 
@@ -591,11 +564,7 @@ else:
                                     sess.commit()
                                 st.success("Komentar terkirim")
                                 st.rerun()
-                        with SessionLocal() as sess:
-                            cr = sess.query(Comment, User).join(User, Comment.user_id == User.id)\
-                                  .filter(Comment.place_id == p.id)\
-                                  .order_by(Comment.created_at.desc()).all()
-                        for c, user in cr:
+                        for c, user in card.get("comments") or []:
                             st.write(f"- *{user.name}* • {c.created_at}: {c.text}")
                     else:
                         st.info("Login untuk memberi rating, komentar, dan bookmark.")
@@ -620,8 +589,8 @@ if st.session_state.get("onboarding"):
             if st.button("Simpan preferensi", width="content"):
                 with SessionLocal() as sess:
                     for pid in sel:
-                        r = sess.query(Rating).filter_by(user_id=u["id"], place_id=int(pid)).first()
-                        if r: r.rating = 5.0
-                        else: sess.add(Rating(user_id=u["id"], place_id=int(pid), rating=5.0))
-                    sess.commit()
+                        upsert_rating(sess, u["id"], int(pid), 5.0, commit=False)
+                    sess.commit()  # satu transaksi: semua pilihan tersimpan atau tidak sama sekali
+                _cf_apply(u["id"], [(pid, 5.0) for pid in sel])
+                REC_CACHE.invalidate_user(u["id"])
                 st.success("Preferensi tersimpan. Buka tab Home (AI) untuk melihat rekomendasi.")
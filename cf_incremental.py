@@ -0,0 +1,183 @@
+import threading
+import numpy as np
+from pathlib import Path
+from scipy.sparse import load_npz, csr_matrix, vstack
+
+
+class IncrementalCF:
+    """
+    Updater CF inkremental berbasis `ui_matrix_csr.npz` (user×item hasil training offline).
+    - Rating live (tabel `ratings`) ditambahkan sebagai baris user baru di bawah matriks training.
+    - sync() membandingkan snapshot rating terakhir → hanya item yang berubah yang dihitung ulang.
+    - apply() hanya menerapkan delta (user, item) yang baru disimpan, tanpa membaca seluruh tabel;
+      background=True → refresh dijalankan worker thread (delta beruntun digabung jadi satu refresh).
+    - Kemiripan = cosine antar kolom item, diagonal 0 (sama dengan pembentukan cf_item_sim.npy).
+      Norma kolom & CSC matriks training dihitung sekali; refresh hanya menyentuh kolom yang berubah.
+    - Copy-on-write: refresh membangun matriks baru lalu menukar referensi `item_sim` (dan memanggil
+      on_update); matriks yang sedang dibaca thread/sesi lain tidak pernah diubah di tempat.
+    Semua indeks kolom mengikuti urutan fisik artefak CF.
+    """
+
+    def __init__(self, ui_matrix, item_sim=None, on_update=None):
+        self.base = csr_matrix(ui_matrix, dtype=float)
+        self.n_items = self.base.shape[1]
+        self.item_sim = item_sim            # tidak pernah ditulis di tempat (lihat _refresh)
+        self.on_update = on_update          # callback(sim) setelah matriks baru ditukar
+
+        self._base_csc = self.base.tocsc()  # slicing kolom O(nnz kolom), bukan O(nnz matriks)
+        self._base_sq = np.asarray(self.base.multiply(self.base).sum(axis=0), dtype=float).ravel()
+        self._live_rows: dict = {}          # user key → indeks baris live
+        self._live: dict = {}               # (row, col) → rating
+        self._snapshot: dict = {}           # (user key, col) → rating yang sudah diterapkan
+        self._pending: set = set()          # kolom menunggu refresh background
+        self._worker = None
+        self._lock = threading.Lock()       # state rating (live/snapshot/pending)
+        self._swap_lock = threading.Lock()  # satu refresh (salin + tukar) pada satu waktu
+
+        if self.item_sim is None:
+            self.item_sim = np.zeros((self.n_items, self.n_items), dtype=float)
+            self.refresh(np.arange(self.n_items))
+
+    @classmethod
+    def from_artifacts(cls, cf_dir: str, item_sim=None, on_update=None):
+        ui_p = Path(cf_dir) / "ui_matrix_csr.npz"
+        if not ui_p.exists():
+            raise FileNotFoundError(f"{ui_p} tidak ditemukan")
+        return cls(load_npz(ui_p), item_sim=item_sim, on_update=on_update)
+
+    # ---------- Public ----------
+    def sync(self, ratings) -> np.ndarray:
+        """
+        ratings: iterable (user_key, col, rating) berisi SEMUA rating live saat ini.
+        Terapkan selisih terhadap snapshot sebelumnya, refresh kolom yang terdampak,
+        dan kembalikan indeks kolom yang berubah.
+        """
+        current = {}
+        for user_key, col, r in ratings:
+            if col is None or not (0 <= int(col) < self.n_items):
+                continue
+            current[(user_key, int(col))] = float(r)
+
+        with self._lock:
+            changed = {k for k, v in current.items() if self._snapshot.get(k) != v}
+            changed |= {k for k in self._snapshot if k not in current}
+            if not changed:
+                return np.zeros(0, dtype=np.int64)
+
+            for user_key, col in changed:
+                row = self._live_rows.setdefault(user_key, len(self._live_rows))
+                if (user_key, col) in current:
+                    self._live[(row, col)] = current[(user_key, col)]
+                else:
+                    self._live.pop((row, col), None)
+            self._snapshot = current
+            cols = self._cols_of(changed)
+        self._refresh(cols)
+        return cols
+
+    def apply(self, changes, background: bool = False) -> np.ndarray:
+        """
+        changes: iterable (user_key, col, rating) berisi rating yang BARU disimpan saja.
+        Snapshot diperbarui, kolom terdampak di-refresh; return indeks kolom yang berubah.
+        background=True: langsung kembali, refresh dikerjakan worker thread (lihat wait()).
+        """
+        with self._lock:
+            changed = set()
+            for user_key, col, r in changes:
+                if col is None or not (0 <= int(col) < self.n_items):
+                    continue
+                key = (user_key, int(col))
+                if self._snapshot.get(key) == float(r):
+                    continue
+                self._snapshot[key] = float(r)
+                row = self._live_rows.setdefault(user_key, len(self._live_rows))
+                self._live[(row, int(col))] = float(r)
+                changed.add(key)
+            cols = self._cols_of(changed)
+            if background and cols.size:
+                self._pending.update(cols.tolist())
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._drain, name="cf-refresh", daemon=True)
+                    self._worker.start()
+                return cols
+        self._refresh(cols)
+        return cols
+
+    def refresh(self, cols) -> None:
+        self._refresh(np.asarray(cols, dtype=np.int64))
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Tunggu refresh background yang sedang berjalan selesai."""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def matrix(self):
+        """Matriks user×item gabungan (training + live) dalam format CSR."""
+        if not self._live:
+            return self.base
+        keys = list(self._live.keys())
+        rows = np.fromiter((r for r, _ in keys), dtype=np.int64, count=len(keys))
+        cols = np.fromiter((c for _, c in keys), dtype=np.int64, count=len(keys))
+        vals = np.fromiter(self._live.values(), dtype=float, count=len(keys))
+        live = csr_matrix((vals, (rows, cols)), shape=(len(self._live_rows), self.n_items))
+        return vstack([self.base, live], format="csr")
+
+    # ---------- Internal ----------
+    @staticmethod
+    def _cols_of(changed) -> np.ndarray:
+        if not changed:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.fromiter((c for _, c in changed), dtype=np.int64, count=len(changed)))
+
+    def _drain(self) -> None:
+        # worker background: gabungkan semua delta yang menumpuk, satu salinan matriks per putaran
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+                cols = np.fromiter(sorted(self._pending), dtype=np.int64, count=len(self._pending))
+                self._pending.clear()
+            try:
+                self._refresh(cols)
+            except BaseException:
+                with self._lock:
+                    self._worker = None     # apply() berikutnya memulai worker baru
+                raise
+
+    def _rows_sim_locked(self, cols: np.ndarray) -> np.ndarray:
+        """Baris kemiripan cosine untuk kolom `cols` (training + live), tanpa menyusun ulang matriks penuh."""
+        G = self._base_csc[:, cols].T @ self.base
+        sq = self._base_sq.copy()
+        if self._live:
+            keys = list(self._live.keys())
+            rows = np.fromiter((r for r, _ in keys), dtype=np.int64, count=len(keys))
+            cs = np.fromiter((c for _, c in keys), dtype=np.int64, count=len(keys))
+            vals = np.fromiter(self._live.values(), dtype=float, count=len(keys))
+            live = csr_matrix((vals, (rows, cs)), shape=(len(self._live_rows), self.n_items))
+            G = G + live[:, cols].T @ live
+            np.add.at(sq, cs, vals * vals)
+        G = np.asarray(G.todense(), dtype=float)
+        norms = np.sqrt(sq)
+        denom = norms[cols][:, None] * norms[None, :]
+        rows_sim = np.divide(G, denom, out=np.zeros_like(G), where=denom > 0)
+        rows_sim[np.arange(cols.size), cols] = 0.0
+        return rows_sim
+
+    def _refresh(self, cols: np.ndarray) -> None:
+        if cols.size == 0:
+            return
+        with self._swap_lock:
+            with self._lock:
+                rows_sim = self._rows_sim_locked(cols)
+            # copy-on-write (di luar _lock → apply() tidak ikut menunggu salinan):
+            # susun matriks baru di samping, lalu tukar referensi sekali
+            sim = self.item_sim
+            sim = sim.toarray() if hasattr(sim, "toarray") else np.array(sim, copy=True)
+            rows_sim = rows_sim.astype(sim.dtype, copy=False)
+            sim[cols, :] = rows_sim
+            sim[:, cols] = rows_sim.T
+            self.item_sim = sim
+            if self.on_update is not None:
+                self.on_update(sim)
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 
 # Normalize DATABASE_URL for postgres://
@@ -13,6 +13,80 @@ def normalize_db_url(url: str) -> str:
 DEFAULT_SQLITE = "sqlite:///eco.db"
 DATABASE_URL = normalize_db_url(os.environ.get("DATABASE_URL", DEFAULT_SQLITE))
 
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def make_engine(url: str = DATABASE_URL, **kwargs):
+    """
+    Engine factory dengan setelan per dialek (bisa dioverride via env):
+    - SQLite  : journal_mode=WAL, synchronous=NORMAL, mmap_size, busy_timeout → baca & tulis
+                antar sesi Streamlit tidak saling mengunci ("database is locked").
+                Env: SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS.
+    - Postgres: pool_size/max_overflow/pool_recycle/pool_timeout + pool_pre_ping.
+                Env: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT, DB_POOL_PRE_PING.
+    """
+    opts = {"echo": False, "future": True}
+    is_sqlite = url.startswith("sqlite")
+    if is_sqlite:
+        busy_ms = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+        opts["connect_args"] = {"timeout": busy_ms / 1000.0}
+    else:
+        opts.update(
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        )
+    opts.update(kwargs)
+    eng = create_engine(url, **opts)
+
+    if is_sqlite and ":memory:" not in url:
+        pragmas = {
+            "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+            "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        }
+
+        @event.listens_for(eng, "connect")
+        def _set_sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                for k, v in pragmas.items():
+                    cur.execute(f"PRAGMA {k}={v}")
+            finally:
+                cur.close()
+
+    return eng
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
 Base = declarative_base()
+
+def add_missing_columns(bind, base=None) -> list[str]:
+    """
+    Migrasi ringan (tanpa Alembic): tambahkan kolom model yang belum ada di tabel existing
+    via ALTER TABLE ... ADD COLUMN. Return daftar "tabel.kolom" yang ditambahkan.
+    """
+    base = base or Base
+    insp = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=bind.dialect)}"
+                default = getattr(col.default, "arg", None)
+                if isinstance(default, (int, float)) and not isinstance(default, bool):
+                    ddl += f" DEFAULT {default}"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{col.name}")
+    return added
@@ -0,0 +1,36 @@
+import argparse, json
+from db import Base, engine, SessionLocal, add_missing_columns
+from utils import repair_rating_aggregates, seed_places
+
+def cmd_repair_ratings(args):
+    Base.metadata.create_all(bind=engine)
+    added = add_missing_columns(engine)
+    with SessionLocal() as sess:
+        n = repair_rating_aggregates(sess)
+    print(json.dumps({"places_updated": n, "columns_added": added}, indent=2, ensure_ascii=False))
+
+def cmd_seed_places(args):
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    with SessionLocal() as sess:
+        n = seed_places(sess, csv_path=args.csv, upsert=args.upsert, chunk_size=args.chunk_size)
+    print(json.dumps({"rows": n, "upsert": args.upsert}, indent=2, ensure_ascii=False))
+
+def main():
+    p = argparse.ArgumentParser(prog="python manage.py", description="Perintah maintenance DB EcoTourism Recsys")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("repair-ratings", help="Backfill/repair rating_count, rating_sum, rating_avg dari tabel ratings")
+    s.set_defaults(func=cmd_repair_ratings)
+
+    s = sub.add_parser("seed-places", help="Bulk seeding tabel places dari CSV")
+    s.add_argument("--csv", default=None, help="Path CSV (default: auto-detect seperti saat start app)")
+    s.add_argument("--upsert", action="store_true", help="Sinkron ulang tempat yang sudah ada (tanpa truncate)")
+    s.add_argument("--chunk-size", type=int, default=1000, help="Jumlah baris per batch INSERT")
+    s.set_defaults(func=cmd_seed_places)
+
+    args = p.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
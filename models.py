@@ -22,6 +22,9 @@ class Place(Base):
     price_num = Column(Float, default=0.0)
     price_str = Column(String(64), default="")
     rating_avg = Column(Float, default=0.0)
+    # agregat rating dari tabel ratings, di-update inkremental saat rating disimpan (lihat utils.upsert_rating)
+    rating_count = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0.0)
     image = Column(String(500), default="")
     gallery1 = Column(String(500), default="")
     gallery2 = Column(String(500), default="")
@@ -1,7 +1,9 @@
-from typing import Tuple, List, Dict, Any, Optional
-from .index import RagIndex
+from typing import Tuple, List, Dict, Any, Optional, Callable, Iterator
+import threading
+from cachetools import TTLCache
+from .index import RagIndex, normalize_query
 from .config import RAGSettings
-from .llm import chat_gemini
+from .llm import chat_gemini, chat_gemini_stream
 
 SYSTEM_PROMPT = """Kamu adalah asisten RAG yang akurat untuk audiens Indonesia.
 - Jawab hanya berdasarkan konteks; jika tidak cukup, katakan tidak tahu dan sarankan unggah/tambah dokumen.
@@ -27,6 +29,17 @@ def _history_to_text(history: Optional[List[Dict[str, str]]], max_turns: int = 6
             lines.append(f"Assistant: {content}")
     return "\n".join(lines)
 
+def _history_key(history: Optional[List[Dict[str, str]]], query: str, max_turns: int = 6) -> Tuple:
+    """Riwayat untuk kunci cache: tanpa giliran user saat ini (sudah diwakili query), teks ternormalisasi."""
+    if not history:
+        return ()
+    pairs = history[-max_turns:]
+    last = pairs[-1]
+    if last.get("role", "user") == "user" and normalize_query(last.get("content", "")) == normalize_query(query):
+        pairs = pairs[:-1]
+    return tuple((m.get("role", "user") == "user", normalize_query(m.get("content", "")))
+                 for m in pairs if m.get("content"))
+
 def _dedupe_citations(hits: List[Dict[str, Any]], limit: int = 3) -> List[Dict[str, Any]]:
     seen = set()
     out: List[Dict[str, Any]] = []
@@ -40,10 +53,66 @@ def _dedupe_citations(hits: List[Dict[str, Any]], limit: int = 3) -> List[Dict[s
             break
     return out
 
-def ask(index: RagIndex, settings: RAGSettings, query: str, k: int = 6,
-        model: Optional[str] = None, temperature: float = 0.3,
-        history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+class AnswerCache:
+    """
+    Cache jawaban (LRU + TTL), kunci = (query ternormalisasi, id chunk hasil retrieval,
+    riwayat sebelum giliran ini (ternormalisasi), model, suhu).
+    Versi index berubah (ingest/hapus chunk) → seluruh isi cache dibuang.
+    Jawaban error LLM tidak disimpan.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 900):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version) -> Optional[str]:
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+            val = self._cache.get(key)
+            if val is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return val
+
+    def put(self, key, version, val: str) -> None:
+        if not val or val.startswith("(LLM error)"):
+            return
+        with self._lock:
+            if version == self._version:
+                self._cache[key] = val
+
+    def get_or_compute(self, key, version, compute: Callable[[], str]) -> str:
+        val = self.get(key, version)
+        if val is None:
+            val = compute()
+            self.put(key, version, val)
+        return val
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+_ANSWER_CACHE: Optional[AnswerCache] = None
+_ANSWER_CACHE_LOCK = threading.Lock()
 
+def get_answer_cache(settings: RAGSettings) -> Optional[AnswerCache]:
+    """Cache jawaban bersama per proses (None jika answer_cache_size = 0)."""
+    global _ANSWER_CACHE
+    if settings.answer_cache_size <= 0:
+        return None
+    with _ANSWER_CACHE_LOCK:
+        if _ANSWER_CACHE is None:
+            _ANSWER_CACHE = AnswerCache(settings.answer_cache_size, settings.answer_cache_ttl)
+        return _ANSWER_CACHE
+
+def _prepare(index: RagIndex, settings: RAGSettings, query: str, k: int, model: Optional[str],
+             temperature: float, history: Optional[List[Dict[str, str]]]):
     hits = index.retrieve(query, k=k)
 
     ctx_blocks = []
@@ -62,8 +131,7 @@ def ask(index: RagIndex, settings: RAGSettings, query: str, k: int = 6,
             structured_facts.append(f"- MAP: {place} -> {map_url}")
 
     history_text = _history_to_text(history, max_turns=6)
-
-    answer = chat_gemini(
+    llm_kwargs = dict(
         system_prompt=SYSTEM_PROMPT,
         user_query=query,
         context_blocks=ctx_blocks,
@@ -72,6 +140,55 @@ def ask(index: RagIndex, settings: RAGSettings, query: str, k: int = 6,
         model=model or settings.chat_model,
         temperature=temperature
     )
+    key = (normalize_query(query), tuple(h.get("id") for h in hits), _history_key(history, query, max_turns=6),
+           model or settings.chat_model, float(temperature))
+    return hits, llm_kwargs, key
+
+def ask(index: RagIndex, settings: RAGSettings, query: str, k: int = 6,
+        model: Optional[str] = None, temperature: float = 0.3,
+        history: Optional[List[Dict[str, str]]] = None,
+        answer_cache: Optional[AnswerCache] = None) -> Tuple[str, List[Dict[str, Any]]]:
+
+    hits, llm_kwargs, key = _prepare(index, settings, query, k, model, temperature, history)
+
+    cache = answer_cache if answer_cache is not None else get_answer_cache(settings)
+    if cache is None:
+        answer = chat_gemini(**llm_kwargs)
+    else:
+        answer = cache.get_or_compute(key, index.version, lambda: chat_gemini(**llm_kwargs))
 
     citations = _dedupe_citations(hits, limit=3)
     return answer, citations
+
+def ask_stream(index: RagIndex, settings: RAGSettings, query: str, k: int = 6,
+               model: Optional[str] = None, temperature: float = 0.3,
+               history: Optional[List[Dict[str, str]]] = None,
+               answer_cache: Optional[AnswerCache] = None,
+               llm_stream: Optional[Callable[..., Iterator[str]]] = None) -> Tuple[Iterator[str], List[Dict[str, Any]]]:
+    """
+    Seperti ask(), tetapi jawaban dikembalikan sebagai iterator potongan teks (streaming).
+    Retrieval dijalankan langsung (sitasi siap dipakai); LLM baru dipanggil saat iterator dikonsumsi.
+    llm_stream: pengganti chat_gemini_stream (mis. LLM palsu untuk pengujian).
+    Jawaban cache → di-yield sekali; jawaban baru disimpan ke cache setelah stream selesai.
+    """
+    hits, llm_kwargs, key = _prepare(index, settings, query, k, model, temperature, history)
+    cache = answer_cache if answer_cache is not None else get_answer_cache(settings)
+    version = index.version if cache is not None else None
+    stream_fn = llm_stream or chat_gemini_stream
+
+    def gen() -> Iterator[str]:
+        if cache is not None:
+            cached = cache.get(key, version)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        failed = False
+        for piece in stream_fn(**llm_kwargs):
+            parts.append(piece)
+            failed = failed or piece.startswith("(LLM error)")
+            yield piece
+        if cache is not None and not failed:
+            cache.put(key, version, "".join(parts))
+
+    return gen(), _dedupe_citations(hits, limit=3)
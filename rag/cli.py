@@ -52,8 +52,11 @@ def cmd_ingest(args):
     if not paths:
         print("Tidak ada file untuk diindeks.", file=sys.stderr)
         sys.exit(1)
-    n = idx.ingest_paths(paths, tags=args.tags or "")
-    print(json.dumps({"ingested_chunks": n, "files": paths}, indent=2, ensure_ascii=False))
+    stats = idx.sync_paths(paths, tags=args.tags or "", batch_size=args.batch_size,
+                           checkpoint=not args.no_resume, workers=args.workers)
+    print(json.dumps({"ingested_chunks": stats["upserted"], "deleted_chunks": stats["deleted"],
+                      "unchanged_chunks": stats["unchanged"], "files_skipped": stats["files_skipped"],
+                      "files": paths}, indent=2, ensure_ascii=False))
 
 def cmd_query(args):
     settings, idx = _load_index()
@@ -101,6 +104,9 @@ def main():
     s.add_argument("files", nargs="*", help="File untuk diindeks (PDF/TXT/...)")
     s.add_argument("--dir", help="Direktori (recursive) untuk diindeks")
     s.add_argument("--tags", default="", help="Tag metadata opsional")
+    s.add_argument("--batch-size", type=int, default=None, help="Chunk per batch embed+upsert (default INGEST_BATCH_SIZE)")
+    s.add_argument("--no-resume", action="store_true", help="Abaikan checkpoint, proses ulang semua file")
+    s.add_argument("--workers", type=int, default=None, help="Proses parser paralel (0 = semua core, default PARSE_WORKERS)")
     s.set_defaults(func=cmd_ingest)
 
     s = sub.add_parser("query", help="Ajukan pertanyaan ke RAG")
@@ -8,6 +8,19 @@ class RAGSettings:
     llama_cloud_api_key: str = ""
     embedding_model: str = "text-embedding-004"
     chat_model: str = "gemini-2.5-flash"
+    embed_batch_size: int = 100
+    embed_workers: int = 4
+    embed_max_retries: int = 5
+    embed_cache_path: str = ""          # kosong → <chroma_db_path>/embed_cache.sqlite
+    embed_cache_max: int = 200_000      # 0 → cache nonaktif
+    ingest_batch_size: int = 256        # chunk per embed+upsert saat ingest
+    parse_workers: int = 1              # proses parser paralel (0 → jumlah CPU, 1 → sekuensial)
+    parse_timeout: float = 300.0        # detik per file/task parse (mode paralel; 0 → tanpa batas)
+    pdf_pages_per_task: int = 25        # PDF besar dipecah per N halaman (mode paralel; 0 → per file)
+    query_cache_size: int = 1024        # cache embedding query (teks ternormalisasi), 0 → nonaktif
+    query_cache_ttl: float = 3600.0
+    answer_cache_size: int = 256        # cache jawaban (query, chunk hasil retrieval, model, suhu), 0 → nonaktif
+    answer_cache_ttl: float = 900.0
 
     @classmethod
     def from_env(cls):
@@ -17,4 +30,17 @@ class RAGSettings:
             llama_cloud_api_key=os.environ.get("LLAMA_CLOUD_API_KEY", ""),
             embedding_model=os.environ.get("EMBED_MODEL", "text-embedding-004"),
             chat_model=os.environ.get("CHAT_MODEL", "gemini-2.5-flash"),
+            embed_batch_size=int(os.environ.get("EMBED_BATCH_SIZE", 100)),
+            embed_workers=int(os.environ.get("EMBED_WORKERS", 4)),
+            embed_max_retries=int(os.environ.get("EMBED_MAX_RETRIES", 5)),
+            embed_cache_path=os.environ.get("EMBED_CACHE_PATH", ""),
+            embed_cache_max=int(os.environ.get("EMBED_CACHE_MAX", 200_000)),
+            ingest_batch_size=int(os.environ.get("INGEST_BATCH_SIZE", 256)),
+            parse_workers=int(os.environ.get("PARSE_WORKERS", 1)),
+            parse_timeout=float(os.environ.get("PARSE_TIMEOUT", 300)),
+            pdf_pages_per_task=int(os.environ.get("PDF_PAGES_PER_TASK", 25)),
+            query_cache_size=int(os.environ.get("RAG_QUERY_CACHE_SIZE", 1024)),
+            query_cache_ttl=float(os.environ.get("RAG_QUERY_CACHE_TTL", 3600)),
+            answer_cache_size=int(os.environ.get("RAG_ANSWER_CACHE_SIZE", 256)),
+            answer_cache_ttl=float(os.environ.get("RAG_ANSWER_CACHE_TTL", 900)),
         )
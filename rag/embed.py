@@ -1,25 +1,119 @@
-from typing import List
+from typing import List, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
 import google.generativeai as genai
+from .embed_cache import EmbeddingCache, cache_key
+
+
+class EmbeddingError(RuntimeError):
+    """Embedding gagal setelah semua retry (tidak diganti vektor nol diam-diam)."""
+
+    def __init__(self, message: str, failed: Optional[List[int]] = None):
+        super().__init__(message)
+        self.failed = failed or []  # indeks teks (posisi di input) yang gagal
+
 
 class GeminiEmbedder:
-    def __init__(self, api_key: str, model: str = "text-embedding-004"):
-        if not api_key:
-            raise RuntimeError("GOOGLE_API_KEY is required.")
-        genai.configure(api_key=api_key)
+    """
+    Embedder Gemini dengan:
+    - batch: banyak teks per request `embed_content` (batch_size teks/request),
+    - worker pool terbatas (max_workers batch paralel),
+    - retry dengan exponential backoff + jitter,
+    - kegagalan dilaporkan sebagai EmbeddingError,
+    - cache persisten opsional (EmbeddingCache): teks yang pernah di-embed tidak dikirim ulang.
+    `embed_fn` bisa diganti stub lokal (signature sama dengan genai.embed_content) untuk pengujian.
+    """
+
+    def __init__(self, api_key: str, model: str = "text-embedding-004", batch_size: int = 100,
+                 max_workers: int = 4, max_retries: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 20.0, embed_fn: Optional[Callable] = None,
+                 cache: Optional[EmbeddingCache] = None):
+        if embed_fn is None:
+            if not api_key:
+                raise RuntimeError("GOOGLE_API_KEY is required.")
+            genai.configure(api_key=api_key)
+            embed_fn = genai.embed_content
         self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self._embed_fn = embed_fn
+        self.cache = cache
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        out = []
-        for t in texts:
-            tt = t if (t and t.strip()) else " "
+        texts = [t if (t and t.strip()) else " " for t in texts]
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        keys = [cache_key(self.model, t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}  # teks kembar cukup sekali
+        if missing:
             try:
-                r = genai.embed_content(model=self.model, content=tt)
-                vec = r.get("embedding") or r.get("embeddings") or []
-            except Exception:
-                # fallback zero vector
-                vec = [0.0] * 768
-            out.append(vec)
-        return out
+                vecs = self._embed_uncached(list(missing.values()))
+            except EmbeddingError as e:
+                bad = {list(missing)[i] for i in e.failed}
+                e.failed = [i for i, k in enumerate(keys) if k in bad]  # posisi pada input asli
+                raise
+            fresh = dict(zip(missing.keys(), vecs))
+            self.cache.put_many(fresh.items())
+            found.update(fresh)
+        return [found[k] for k in keys]
 
     def embed_one(self, text: str) -> List[float]:
         return self.embed([text])[0]
+
+    # ---------- Internal ----------
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        starts = list(range(0, len(texts), self.batch_size))
+        batches = [texts[s:s + self.batch_size] for s in starts]
+
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        errors = {}
+        workers = min(self.max_workers, len(batches))
+        if workers == 1:
+            for i, b in enumerate(batches):
+                try:
+                    results[i] = self._embed_batch(b)
+                except Exception as e:
+                    errors[i] = e
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futs = {i: pool.submit(self._embed_batch, b) for i, b in enumerate(batches)}
+                for i, f in futs.items():
+                    try:
+                        results[i] = f.result()
+                    except Exception as e:
+                        errors[i] = e
+
+        if errors:
+            failed = [j for i in sorted(errors) for j in range(starts[i], starts[i] + len(batches[i]))]
+            first = errors[min(errors)]
+            raise EmbeddingError(
+                f"Embedding gagal untuk {len(failed)}/{len(texts)} teks ({len(errors)} batch): {first}",
+                failed=failed,
+            )
+        return [vec for batch in results for vec in batch]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                r = self._embed_fn(model=self.model, content=batch if len(batch) > 1 else batch[0])
+                vecs = r.get("embedding") or r.get("embeddings") or []
+                if len(batch) == 1 and vecs and not isinstance(vecs[0], (list, tuple)):
+                    vecs = [vecs]
+                if len(vecs) != len(batch) or any(not v for v in vecs):
+                    raise EmbeddingError(f"respons embedding tidak lengkap ({len(vecs)}/{len(batch)} vektor)")
+                return [list(v) for v in vecs]
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                time.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
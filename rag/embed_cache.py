@@ -0,0 +1,100 @@
+from typing import List, Dict, Optional, Iterable
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+def cache_key(model: str, text: str) -> str:
+    """Kunci content-addressed: model + sha256(teks)."""
+    return f"{model}:{hashlib.sha256((text or '').encode('utf-8')).hexdigest()}"
+
+
+class EmbeddingCache:
+    """
+    Cache embedding persisten di SQLite (satu file, aman dipakai antar proses/restart).
+    - get_many/put_many berbasis cache_key(model, teks).
+    - Ukuran dibatasi max_entries; entri yang paling lama tidak dipakai (last_used) dibuang lebih dulu.
+    - Penghitung hits/misses untuk observasi.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(uniq), 500):  # batas parameter SQLite
+                part = uniq[i:i + 500]
+                q = f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})"
+                for k, blob in self._conn.execute(q, part):
+                    found[k] = np.frombuffer(blob, dtype=np.float64).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used=? WHERE key=?",
+                                       [(now, k) for k in found])
+                self._conn.commit()
+            hit = sum(1 for k in keys if k in found)
+            self.hits += hit
+            self.misses += len(keys) - hit
+        return found
+
+    def put_many(self, items: Iterable) -> None:
+        """items: iterable (key, vektor)."""
+        now = time.time()
+        rows = [(k, np.asarray(v, dtype=np.float64).tobytes(), now) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(key, vec, last_used) VALUES (?, ?, ?)", rows
+            )
+            n = int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+            if n > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_embedding_cache(path: str, max_entries: int) -> Optional[EmbeddingCache]:
+    """Buka cache; None jika dinonaktifkan (max_entries <= 0 / path kosong)."""
+    if not path or int(max_entries) <= 0:
+        return None
+    return EmbeddingCache(path, max_entries=max_entries)
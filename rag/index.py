@@ -1,9 +1,16 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import json
 import os
+import queue
+import re
+import threading
+from cachetools import TTLCache
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from .embed import GeminiEmbedder
-from .parser import parse_files
+from .embed_cache import open_embedding_cache
+from .parser import iter_parse_file, iter_parse_files_parallel, make_llama_parser
 from .chunk import chunk_text
 from .config import RAGSettings
 
@@ -23,6 +30,89 @@ def _sanitize_meta(m: Dict[str, Any]) -> Dict[str, Any]:
             clean[k] = str(v)
     return clean
 
+def _content_hash(text: str, meta: Dict[str, Any], ignore: Tuple[str, ...] = ()) -> str:
+    m = {k: v for k, v in meta.items() if k != "content_hash" and k not in ignore}
+    raw = (text or "") + "\x1f" + json.dumps(m, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# kolom kunci baris CSV (urutan prioritas) → id chunk stabil walau baris lain disisip/dihapus
+_ROW_KEY_COLS = ("place_id", "id")
+
+def _row_chunk_id(source: str, page: int, meta: Dict[str, Any]) -> Tuple[str, bool]:
+    """Id chunk baris CSV: dari kolom kunci jika ada, selain itu nomor baris. Return (id, berkunci)."""
+    for c in _ROW_KEY_COLS:
+        v = meta.get(c)
+        if v is not None and str(v).strip() != "":
+            return f"{source}::{c}={str(v).strip()}", True
+    return f"{source}::row{page}", False
+
+def normalize_query(q: str) -> str:
+    """Normalisasi pertanyaan untuk kunci cache: lowercase, spasi dirapikan, tanda baca akhir dibuang."""
+    return re.sub(r"\s+", " ", (q or "").strip().lower()).rstrip(" ?!.")
+
+def _file_fingerprint(path: str, tags: Optional[str]) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime, "tags": tags or ""}
+
+class _Checkpoint:
+    """Catatan file yang sudah selesai di-ingest (JSON, ditulis atomik setiap satu file selesai)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except Exception:
+            self.state = {}
+
+    def done(self, file_path: str, fp: Dict[str, Any]) -> bool:
+        return self.state.get(os.path.realpath(file_path)) == fp
+
+    def mark(self, file_path: str, fp: Dict[str, Any]) -> None:
+        self.state[os.path.realpath(file_path)] = fp
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+_END = object()
+
+def _prefetch(it, maxsize: int):
+    """Jalankan iterator di thread produsen dengan antrean terbatas; error produsen diteruskan ke konsumen."""
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in it:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:  # diteruskan ke konsumen
+            put(e)
+
+    t = threading.Thread(target=produce, daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
 def _normalize_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     if not where:
         return None
@@ -42,7 +132,24 @@ class RagIndex:
             settings=ChromaSettings(allow_reset=True)
         )
         self.collection = self.client.get_or_create_collection("rag_docs")
-        self.embedder = GeminiEmbedder(api_key=self.settings.google_api_key, model=self.settings.embedding_model)
+        self.embedder = GeminiEmbedder(
+            api_key=self.settings.google_api_key,
+            model=self.settings.embedding_model,
+            batch_size=self.settings.embed_batch_size,
+            max_workers=self.settings.embed_workers,
+            max_retries=self.settings.embed_max_retries,
+            cache=open_embedding_cache(
+                self.settings.embed_cache_path or os.path.join(self.settings.chroma_db_path, "embed_cache.sqlite"),
+                self.settings.embed_cache_max,
+            ),
+        )
+        # cache embedding query in-memory (LRU + TTL); versi naik setiap isi index berubah
+        self._qcache = (TTLCache(maxsize=self.settings.query_cache_size, ttl=self.settings.query_cache_ttl)
+                        if self.settings.query_cache_size > 0 else None)
+        self._qlock = threading.Lock()
+        self.query_hits = 0
+        self.query_misses = 0
+        self._writes = 0
 
     # -------- Utilities --------
     def count(self) -> int:
@@ -52,6 +159,11 @@ class RagIndex:
             got = self.collection.get(limit=1)
             return len(got.get("ids", []))
 
+    @property
+    def version(self):
+        """Penanda isi index: berubah saat proses ini menulis/menghapus chunk atau jumlah vektor berubah."""
+        return (self._writes, self.count())
+
     def has_source(self, path_or_basename: str) -> bool:
         base = os.path.basename(path_or_basename)
         try:
@@ -68,50 +180,153 @@ class RagIndex:
 
     # -------- Ingestion --------
     def ingest_paths(self, paths: List[str], tags: Optional[str] = "") -> int:
-        docs = parse_files(paths, llama_api_key=self.settings.llama_cloud_api_key)
-
-        all_ids: List[str] = []
-        all_texts: List[str] = []
-        all_metas: List[Dict[str, Any]] = []
-
-        for doc in docs:
-            source = doc.get("source", "")
-            base_page = int(doc.get("page", 0))
-            base_meta = doc.get("meta", {}) or {}
-            is_atomic = bool(doc.get("is_atomic", False))
-
-            if is_atomic:
-                # satu baris CSV = satu chunk
-                cid = f"{source}::row{base_page}"
-                all_ids.append(cid)
-                all_texts.append(doc.get("text", ""))
-                md = {"source": source, "page": base_page, "tags": tags or ""}
-                md.update(base_meta)
-                all_metas.append(_sanitize_meta(md))
+        """Indeks file (mode sync inkremental). Return jumlah chunk yang ditulis (baru/berubah)."""
+        return self.sync_paths(paths, tags=tags)["upserted"]
+
+    def sync_paths(self, paths: List[str], tags: Optional[str] = "", batch_size: Optional[int] = None,
+                   checkpoint: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Sync inkremental per file, streaming (parse → chunk → embed → upsert per batch):
+        - tiap chunk diberi `content_hash` (sha256 teks + metadata),
+        - hanya chunk baru/berubah yang di-embed & di-upsert, maksimal `batch_size` chunk sekali jalan,
+        - chunk lama yang tidak ada lagi di file dihapus, yang sama dibiarkan.
+        checkpoint=True: file yang sudah selesai (ukuran+mtime+tags sama) dilewati → ingest bisa dilanjutkan.
+        workers != 1: parsing file memakai process pool (default settings.parse_workers).
+        Return {"upserted", "deleted", "unchanged", "files_skipped"}.
+        """
+        batch_size = max(1, int(batch_size or self.settings.ingest_batch_size))
+        workers = self.settings.parse_workers if workers is None else int(workers)
+        ckpt = _Checkpoint(os.path.join(self.settings.chroma_db_path, "ingest_checkpoint.json")) if checkpoint else None
+
+        stats = {"upserted": 0, "deleted": 0, "unchanged": 0, "files_skipped": 0}
+        todo = []
+        for path in paths:
+            fp = _file_fingerprint(path, tags)
+            if ckpt is not None and ckpt.done(path, fp):
+                stats["files_skipped"] += 1
             else:
-                # dokumen panjang → chunking
-                chs = chunk_text(source=source, text=doc.get("text", ""), chunk_size=1200, chunk_overlap=200)
-                for c in chs:
-                    c["tags"] = tags or ""
-                    # gunakan page asal (0) untuk pdf/txt, boleh juga pakai nomor chunk
-                    page_val = c.get("page", base_page)
-                    cid = c["id"]
-                    all_ids.append(cid)
-                    all_texts.append(c["text"])
-                    md = {"source": c["source"], "page": page_val, "tags": c["tags"]}
-                    md.update(base_meta)  # meta umum dari dokumen asal
-                    all_metas.append(_sanitize_meta(md))
-
-        if not all_ids:
-            return 0
-
-        embs = self.embedder.embed(all_texts)
-        self.collection.add(ids=all_ids, documents=all_texts, embeddings=embs, metadatas=all_metas)
-        return len(all_ids)
+                todo.append((path, fp))
+        if not todo:
+            return stats
+
+        todo_paths = [p for p, _ in todo]
+        if workers != 1:
+            # parse paralel (process pool), hasil tetap berurutan per file; satu PDF besar pun dipecah per halaman
+            parsed = iter_parse_files_parallel(
+                todo_paths, self.settings.llama_cloud_api_key, workers=workers,
+                timeout=self.settings.parse_timeout or None, pdf_pages_per_task=self.settings.pdf_pages_per_task,
+            )
+        else:
+            parser = make_llama_parser(self.settings.llama_cloud_api_key)
+            parsed = ((p, iter_parse_file(p, parser)) for p in todo_paths)
+
+        fps = dict(todo)
+        for path, docs in parsed:
+            for k, v in self._sync_file(path, docs, tags, batch_size).items():
+                stats[k] += v
+            if ckpt is not None:
+                ckpt.mark(path, fps[path])
+        return stats
+
+    def _sync_file(self, path: str, docs, tags: Optional[str], batch_size: int) -> Dict[str, int]:
+        existing = self._existing_hashes(os.path.basename(path))
+        stats = {"upserted": 0, "deleted": 0, "unchanged": 0}
+        seen = set()
+        pending: List[Tuple[str, str, Dict[str, Any]]] = []
+
+        records = (r for doc in docs for r in self._doc_records(doc, tags))
+        # parsing jalan di thread terpisah, antrean dibatasi → memori tetap datar (backpressure)
+        for cid, text, md in _prefetch(records, maxsize=2 * batch_size):
+            if cid in seen and _row_chunk_id(md.get("source", ""), md.get("page", 0), md) == (cid, True):
+                # kunci baris CSV kembar → baris berikutnya pakai id nomor baris (tetap terindeks)
+                cid = f"{md['source']}::row{md['page']}"
+                md["content_hash"] = _content_hash(text, md)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            if existing.get(cid) == md["content_hash"]:
+                stats["unchanged"] += 1
+                continue
+            pending.append((cid, text, md))
+            if len(pending) >= batch_size:
+                self._write_batch(pending)
+                stats["upserted"] += len(pending)
+                pending = []
+        if pending:
+            self._write_batch(pending)
+            stats["upserted"] += len(pending)
+
+        # file gagal diparse / kosong → jangan hapus isi index yang ada
+        stale = [cid for cid in existing if cid not in seen] if seen else []
+        for i in range(0, len(stale), batch_size):
+            self.collection.delete(ids=stale[i:i + batch_size])
+            self._writes += 1
+        stats["deleted"] = len(stale)
+        return stats
+
+    def _write_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        ids = [cid for cid, _, _ in batch]
+        texts = [t for _, t, _ in batch]
+        embs = self.embedder.embed(texts)
+        self.collection.upsert(ids=ids, documents=texts, embeddings=embs, metadatas=[md for _, _, md in batch])
+        self._writes += 1
+
+    def _doc_records(self, doc: Dict[str, Any], tags: Optional[str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        source = doc.get("source", "")
+        base_page = int(doc.get("page", 0))
+        base_meta = doc.get("meta", {}) or {}
+        out: List[Tuple[str, str, Dict[str, Any]]] = []
+
+        if doc.get("is_atomic", False):
+            # satu baris CSV = satu chunk; id dari kolom kunci (place_id/id) agar stabil, page tetap untuk sitasi
+            md = {"source": source, "page": base_page, "tags": tags or ""}
+            md.update(base_meta)
+            md = _sanitize_meta(md)
+            cid, keyed = _row_chunk_id(source, base_page, md)
+            # berkunci: nomor baris tidak ikut hash → baris yang hanya bergeser tidak di-embed/ditulis ulang
+            md["content_hash"] = _content_hash(doc.get("text", ""), md, ignore=("page",) if keyed else ())
+            return [(cid, doc.get("text", ""), md)]
+        else:
+            # dokumen panjang → chunking
+            chs = chunk_text(source=source, text=doc.get("text", ""), chunk_size=1200, chunk_overlap=200)
+            for c in chs:
+                # gunakan page asal (0) untuk pdf/txt, boleh juga pakai nomor chunk
+                md = {"source": c["source"], "page": c.get("page", base_page), "tags": tags or ""}
+                md.update(base_meta)  # meta umum dari dokumen asal
+                out.append((c["id"], c["text"], _sanitize_meta(md)))
+
+        for _, text, md in out:
+            md["content_hash"] = _content_hash(text, md)
+        return out
+
+    def _existing_hashes(self, source: str) -> Dict[str, str]:
+        try:
+            res = self.collection.get(where={"source": {"$eq": source}}, include=["metadatas"])
+        except Exception:
+            return {}
+        ids = res.get("ids") or []
+        metas = res.get("metadatas") or [None] * len(ids)
+        return {i: (m or {}).get("content_hash", "") for i, m in zip(ids, metas)}
 
     # -------- Query --------
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding query dengan cache (kunci = model + teks ternormalisasi)."""
+        if self._qcache is None:
+            return self.embedder.embed_one(query)
+        key = (self.settings.embedding_model, normalize_query(query))
+        with self._qlock:
+            vec = self._qcache.get(key)
+            if vec is not None:
+                self.query_hits += 1
+                return vec
+            self.query_misses += 1
+        vec = self.embedder.embed_one(query)
+        with self._qlock:
+            self._qcache[key] = vec
+        return vec
+
     def retrieve(self, query: str, k: int = 6, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        qemb = self.embedder.embed_one(query)
+        qemb = self.embed_query(query)
         qkwargs: Dict[str, Any] = {"query_embeddings": [qemb], "n_results": k}
 
         norm_where = _normalize_where(where)
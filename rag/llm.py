@@ -1,15 +1,13 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 import os
 import google.generativeai as genai
 
-def chat_gemini(
+def _build_prompt(
     system_prompt: str,
     user_query: str,
     context_blocks: List[Dict[str, Any]],
     history_text: str = "",
     structured_facts: str = "",
-    model: str = "gemini-2.5-flash",
-    temperature: float = 0.3,
 ) -> str:
     """
     Bangun prompt dengan:
@@ -17,10 +15,6 @@ def chat_gemini(
     - Konteks retrieval (teks + metadata disarikan)
     - Structured facts (mis. MAP link) agar model eksplisit mengekspose jika diminta.
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if api_key:
-        genai.configure(api_key=api_key)
-
     ctx_text = []
     for i, c in enumerate(context_blocks, 1):
         src = c.get("source", "unknown")
@@ -40,7 +34,7 @@ def chat_gemini(
 
     ctx_blob = "\n\n".join(ctx_text)
 
-    prompt = f"""{system_prompt}
+    return f"""{system_prompt}
 
 # Conversation so far (last turns)
 {history_text or '(none)'}
@@ -62,6 +56,26 @@ def chat_gemini(
 - Bahasa Indonesia, ringkas dan jelas.
 """
 
+
+def _configure():
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        genai.configure(api_key=api_key)
+
+
+def chat_gemini(
+    system_prompt: str,
+    user_query: str,
+    context_blocks: List[Dict[str, Any]],
+    history_text: str = "",
+    structured_facts: str = "",
+    model: str = "gemini-2.5-flash",
+    temperature: float = 0.3,
+) -> str:
+    """Jawaban penuh sekali jadi (blocking). Lihat chat_gemini_stream untuk versi bertahap."""
+    _configure()
+    prompt = _build_prompt(system_prompt, user_query, context_blocks, history_text, structured_facts)
+
     try:
         model_obj = genai.GenerativeModel(model_name=model)
         resp = model_obj.generate_content(
@@ -79,3 +93,34 @@ def chat_gemini(
         text = f"(LLM error) {e}"
 
     return text
+
+
+def chat_gemini_stream(
+    system_prompt: str,
+    user_query: str,
+    context_blocks: List[Dict[str, Any]],
+    history_text: str = "",
+    structured_facts: str = "",
+    model: str = "gemini-2.5-flash",
+    temperature: float = 0.3,
+) -> Iterator[str]:
+    """Sama seperti chat_gemini, tetapi yield potongan teks segera setelah diterima (stream=True)."""
+    _configure()
+    prompt = _build_prompt(system_prompt, user_query, context_blocks, history_text, structured_facts)
+    try:
+        model_obj = genai.GenerativeModel(model_name=model)
+        resp = model_obj.generate_content(
+            prompt,
+            generation_config={"temperature": temperature},
+            stream=True,
+        )
+        for chunk in resp:
+            try:
+                piece = chunk.text or ""
+            except Exception:
+                # chunk tanpa teks (mis. hanya metadata/safety)
+                piece = ""
+            if piece:
+                yield piece
+    except Exception as e:
+        yield f"(LLM error) {e}"
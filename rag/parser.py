@@ -1,5 +1,11 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterator, Optional
+from collections import deque
+import logging
+import multiprocessing as mp
 import os
+import time
+
+log = logging.getLogger(__name__)
 
 # Optional: LlamaParse untuk PDF
 try:
@@ -15,6 +21,7 @@ except Exception:
 
 # CSV support (pandas)
 try:
+    import numpy as np
     import pandas as pd
 except Exception:
     pd = None
@@ -33,6 +40,21 @@ def _read_pdf_basic(path: str) -> str:
         return ""
 
 
+def _pdf_page_count(path: str) -> int:
+    if not PdfReader:
+        return 0
+    try:
+        return len(PdfReader(path).pages)
+    except Exception:
+        return 0
+
+
+def _read_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Ekstrak teks halaman [start, stop) — dipakai worker untuk paralel per halaman."""
+    reader = PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
 def _to_str(x) -> str:
     try:
         s = str(x)
@@ -41,23 +63,52 @@ def _to_str(x) -> str:
         return ""
 
 
-def _csv_rows_as_docs(path: str) -> List[Dict[str, Any]]:
-    """Setiap baris CSV menjadi satu dokumen ATOMIK (tanpa chunking) agar metadata per-baris ikut ke index."""
+_CSV_FLOAT_META = ("price_num", "rating", "rating_avg")
+
+
+def _cell_strings(values: "np.ndarray") -> "np.ndarray":
+    # setara _to_str per sel: str(x), "" jika "nan" (tanpa memperhatikan huruf besar/kecil)
+    out = np.array([str(x) for x in values], dtype=object) if values.dtype == object else values.astype(str).astype(object)
+    s = pd.Series(out, copy=False)
+    maybe = (s.str.len() == 3).to_numpy()
+    if maybe.any():
+        out[np.flatnonzero(maybe)[(s[maybe].str.lower() == "nan").to_numpy()]] = ""
+    return out
+
+
+def _float_meta(values: "np.ndarray", strs: "np.ndarray") -> "np.ndarray":
+    # setara float(val) dengan fallback string; kolom numerik langsung dipakai (str → float round-trip persis)
+    if values.dtype.kind in "iuf":
+        return values.astype(float).astype(object)
+    out = np.empty(len(strs), dtype=object)
+    for i, v in enumerate(strs):
+        try:
+            out[i] = float(v)
+        except Exception:
+            out[i] = v
+    return out
+
+
+def _csv_rows_as_docs(path: str, block_size: int = 2048) -> Iterator[Dict[str, Any]]:
+    """
+    Setiap baris CSV menjadi satu dokumen ATOMIK (tanpa chunking) agar metadata per-baris ikut ke index.
+    Diproses per blok `block_size` baris secara vectorized (per kolom) dan di-yield bertahap.
+    """
     if pd is None:
         # fallback: baca mentah jika pandas tidak ada
         try:
             with open(path, "r", encoding="utf-8", errors="ignore") as f:
                 raw = f.read()
-            base = os.path.basename(path)
-            return [{
-                "source": base,
-                "text": raw,
-                "page": 0,
-                "meta": {},
-                "is_atomic": False,   # akan di-chunk biasa
-            }]
         except Exception:
-            return []
+            return
+        yield {
+            "source": os.path.basename(path),
+            "text": raw,
+            "page": 0,
+            "meta": {},
+            "is_atomic": False,   # akan di-chunk biasa
+        }
+        return
 
     try:
         df = pd.read_csv(path)
@@ -66,19 +117,19 @@ def _csv_rows_as_docs(path: str) -> List[Dict[str, Any]]:
         try:
             with open(path, "r", encoding="utf-8", errors="ignore") as f:
                 raw = f.read()
-            base = os.path.basename(path)
-            return [{
-                "source": base,
-                "text": raw,
-                "page": 0,
-                "meta": {},
-                "is_atomic": False,
-            }]
         except Exception:
-            return []
+            return
+        yield {
+            "source": os.path.basename(path),
+            "text": raw,
+            "page": 0,
+            "meta": {},
+            "is_atomic": False,
+        }
+        return
 
     if df.empty:
-        return []
+        return
 
     base = os.path.basename(path)
 
@@ -94,41 +145,202 @@ def _csv_rows_as_docs(path: str) -> List[Dict[str, Any]]:
     if not used_cols:
         # pakai subset kolom agar ringkas
         used_cols = df.columns.tolist()[:10]
+    col_pos = [df.columns.get_loc(c) for c in used_cols]
 
-    docs: List[Dict[str, Any]] = []
-    for i, row in df.iterrows():
-        meta: Dict[str, Any] = {}
-        parts = []
-        for c in used_cols:
-            val = _to_str(row.get(c, ""))
-            if val:
-                parts.append(f"{c}: {val}")
-                # masukkan juga sebagai metadata terstruktur
-                # NB: metadata harus Bool|Int|Float|Str untuk Chroma Rust → convert ke str/int/float
-                if c in ("price_num", "rating", "rating_avg"):
-                    try:
-                        meta[c] = float(val)
-                    except Exception:
-                        meta[c] = _to_str(val)
-                else:
-                    meta[c] = _to_str(val)
+    for start in range(0, len(df), block_size):
+        block = df.iloc[start:start + block_size]
+        # .values = tipe gabungan semua kolom (sama seperti baris dari df.iterrows())
+        vals = block.values
+        n = len(block)
 
-        # teks ringkas baris
-        text = " | ".join(parts) if parts else ""
+        texts = np.full(n, "", dtype=object)
+        metas_cols = []
+        for c, j in zip(used_cols, col_pos):
+            strs = _cell_strings(vals[:, j])
+            present = strs != ""
+            piece = np.where(present, f"{c}: " + strs, "")
+            sep = np.where((texts != "") & present, " | ", "")
+            texts = texts + sep + piece
+            # NB: metadata harus Bool|Int|Float|Str untuk Chroma Rust → convert ke str/int/float
+            typed = _float_meta(vals[:, j], strs) if c in _CSV_FLOAT_META else strs
+            metas_cols.append((c, typed, present))
 
         # page = nomor baris (1-based) agar sitasi berguna
-        docs.append({
+        pages = block.index.to_numpy()
+        for i in range(n):
+            yield {
+                "source": base,
+                "text": texts[i],
+                "page": int(pages[i]) + 1,
+                "meta": {c: typed[i] for c, typed, present in metas_cols if present[i]},
+                "is_atomic": True,   # jangan di-chunk lagi
+            }
+
+
+def make_llama_parser(llama_api_key: str = ""):
+    """LlamaParse (jika API key & paket tersedia), selain itu None → fallback PyPDF2."""
+    if llama_api_key and LlamaParse is not None:
+        return LlamaParse(api_key=llama_api_key, result_type="text")
+    return None
+
+
+def iter_parse_file(p: str, parser=None) -> Iterator[Dict[str, Any]]:
+    """Parse satu file secara lazy (dokumen di-yield satu per satu, format sama dengan parse_files)."""
+    ext = os.path.splitext(p)[1].lower()
+    base = os.path.basename(p)
+
+    # CSV → per-baris sebagai dokumen atomik
+    if ext == ".csv":
+        yield from _csv_rows_as_docs(p)
+        return
+
+    # PDF
+    if ext == ".pdf":
+        text = ""
+        if parser is not None:
+            try:
+                result = parser.load_data(p)
+                text = "\n".join([d.text for d in result if getattr(d, "text", "")])
+            except Exception:
+                text = ""
+        if not text:
+            text = _read_pdf_basic(p)
+        if text.strip():
+            yield {
+                "source": base,
+                "text": text,
+                "page": 0,
+                "meta": {},
+                "is_atomic": False,  # akan di-chunk
+            }
+        return
+
+    # TXT/MD/LAINNYA
+    try:
+        with open(p, "r", encoding="utf-8", errors="ignore") as f:
+            raw = f.read()
+    except Exception:
+        raw = ""
+    if raw.strip():
+        yield {
             "source": base,
-            "text": text,
-            "page": int(i) + 1,
-            "meta": meta,
-            "is_atomic": True,   # jangan di-chunk lagi
-        })
+            "text": raw,
+            "page": 0,
+            "meta": {},
+            "is_atomic": False,
+        }
+
+
+def _parse_file_task(path: str, llama_api_key: str) -> List[Dict[str, Any]]:
+    # dijalankan di proses worker: parser LlamaParse dibuat di sana (objeknya tidak picklable)
+    return list(iter_parse_file(path, make_llama_parser(llama_api_key)))
+
+
+def _pdf_doc_from_pages(path: str, parts: List[Optional[List[str]]]) -> List[Dict[str, Any]]:
+    # sama dengan jalur sekuensial: satu halaman gagal → seluruh PDF dianggap kosong
+    if any(p is None for p in parts):
+        return []
+    text = "\n".join(t for part in parts for t in part)
+    if not text.strip():
+        return []
+    return [{"source": os.path.basename(path), "text": text, "page": 0, "meta": {}, "is_atomic": False}]
+
+
+def iter_parse_files_parallel(paths: List[str], llama_api_key: str = "", workers: int = 0,
+                              timeout: Optional[float] = 300.0,
+                              pdf_pages_per_task: int = 25) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Parse banyak file dengan process pool; yield (path, docs) sesuai urutan input.
+    - workers: jumlah proses (0 → os.cpu_count()).
+    - timeout: batas detik per task; task yang macet dilewati (docs kosong) dan pool di-restart.
+    - pdf_pages_per_task: PDF besar (tanpa LlamaParse) dipecah per rentang halaman agar paralel per halaman.
+    Jumlah task aktif + hasil yang menunggu giliran dibatasi 2×workers → memori tetap terbatas.
+    """
+    workers = int(workers) or (os.cpu_count() or 1)
+    use_llama = bool(llama_api_key and LlamaParse is not None)
+
+    # task: (file_idx, part_idx, fungsi, args)
+    def tasks_for(i: int, path: str):
+        n_pages = 0
+        if (os.path.splitext(path)[1].lower() == ".pdf" and not use_llama and pdf_pages_per_task > 0):
+            n_pages = _pdf_page_count(path)
+        if n_pages > pdf_pages_per_task:
+            return [(i, j, _read_pdf_pages, (path, s, min(s + pdf_pages_per_task, n_pages)))
+                    for j, s in enumerate(range(0, n_pages, pdf_pages_per_task))]
+        return [(i, 0, _parse_file_task, (path, llama_api_key))]
 
-    return docs
+    ctx = mp.get_context()
+    pool = ctx.Pool(workers)
+    todo = deque()
+    parts: Dict[int, List[Any]] = {}
+    kind: Dict[int, str] = {}
+    remaining: Dict[int, int] = {}
+    finished: Dict[int, List[Dict[str, Any]]] = {}
+    inflight: Dict[Tuple[int, int], Tuple[Any, float, tuple]] = {}
+    next_file = 0      # file berikutnya yang akan dipecah jadi task
+    next_yield = 0     # file berikutnya yang harus di-yield (urutan input)
 
+    def finish_part(i: int, j: int, value) -> None:
+        parts[i][j] = value
+        remaining[i] -= 1
+        if remaining[i] == 0:
+            if kind[i] == "pages":
+                finished[i] = _pdf_doc_from_pages(paths[i], parts[i])
+            else:
+                finished[i] = parts[i][0] or []
+            del parts[i], remaining[i], kind[i]
 
-def parse_files(paths: List[str], llama_api_key: str = "") -> List[Dict[str, Any]]:
+    try:
+        while next_yield < len(paths):
+            # isi antrean task selama jendela masih longgar (backpressure)
+            while next_file < len(paths) and (next_file - next_yield) < 2 * workers and len(todo) < workers:
+                ts = tasks_for(next_file, paths[next_file])
+                parts[next_file] = [None] * len(ts)
+                kind[next_file] = "pages" if ts[0][2] is _read_pdf_pages else "file"
+                remaining[next_file] = len(ts)
+                todo.extend(ts)
+                next_file += 1
+            while todo and len(inflight) < workers:
+                i, j, fn, args = todo.popleft()
+                inflight[(i, j)] = (pool.apply_async(fn, args), time.monotonic(), (i, j, fn, args))
+
+            progressed = False
+            for key, (ar, t0, task) in list(inflight.items()):
+                if ar.ready():
+                    del inflight[key]
+                    try:
+                        value = ar.get()
+                    except Exception as e:
+                        log.warning("Gagal parse %s: %s", paths[key[0]], e)
+                        value = None
+                    finish_part(key[0], key[1], value)
+                    progressed = True
+                elif timeout and time.monotonic() - t0 > timeout:
+                    log.warning("Timeout parse %s (> %ss), dilewati", paths[key[0]], timeout)
+                    del inflight[key]
+                    finish_part(key[0], key[1], None)
+                    # worker macet tidak bisa dihentikan satu per satu → restart pool, ulangi task lain
+                    pool.terminate()
+                    pool = ctx.Pool(workers)
+                    todo.extendleft(reversed([t for _, _, t in inflight.values()]))
+                    inflight.clear()
+                    progressed = True
+                    break
+
+            while next_yield in finished:
+                yield paths[next_yield], finished.pop(next_yield)
+                next_yield += 1
+                progressed = True
+            if not progressed:
+                time.sleep(0.01)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_files(paths: List[str], llama_api_key: str = "", workers: int = 1,
+                timeout: Optional[float] = 300.0, pdf_pages_per_task: int = 25) -> List[Dict[str, Any]]:
     """
     Returns list of dict:
       {
@@ -138,56 +350,15 @@ def parse_files(paths: List[str], llama_api_key: str = "") -> List[Dict[str, Any
         "meta": <dict>,
         "is_atomic": <bool>   # True => dipakai apa adanya, False => akan di-chunk
       }
+    workers != 1 → parse paralel dengan process pool (lihat iter_parse_files_parallel).
     """
     out: List[Dict[str, Any]] = []
-    use_llama = bool(llama_api_key and LlamaParse is not None)
-    parser = None
-    if use_llama:
-        parser = LlamaParse(api_key=llama_api_key, result_type="text")
-
+    if int(workers) != 1 and len(paths) > 0:
+        for _, docs in iter_parse_files_parallel(paths, llama_api_key, workers=workers, timeout=timeout,
+                                                 pdf_pages_per_task=pdf_pages_per_task):
+            out.extend(docs)
+        return out
+    parser = make_llama_parser(llama_api_key)
     for p in paths:
-        ext = os.path.splitext(p)[1].lower()
-        base = os.path.basename(p)
-
-        # CSV → per-baris sebagai dokumen atomik
-        if ext == ".csv":
-            out.extend(_csv_rows_as_docs(p))
-            continue
-
-        # PDF
-        if ext == ".pdf":
-            text = ""
-            if use_llama:
-                try:
-                    result = parser.load_data(p)
-                    text = "\n".join([d.text for d in result if getattr(d, "text", "")])
-                except Exception:
-                    text = ""
-            if not text:
-                text = _read_pdf_basic(p)
-            if text.strip():
-                out.append({
-                    "source": base,
-                    "text": text,
-                    "page": 0,
-                    "meta": {},
-                    "is_atomic": False,  # akan di-chunk
-                })
-            continue
-
-        # TXT/MD/LAINNYA
-        try:
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                raw = f.read()
-        except Exception:
-            raw = ""
-        if raw.strip():
-            out.append({
-                "source": base,
-                "text": raw,
-                "page": 0,
-                "meta": {},
-                "is_atomic": False,
-            })
-
+        out.extend(iter_parse_file(p, parser))
     return out
@@ -3,7 +3,7 @@ from typing import List, Dict
 import streamlit as st
 from .config import RAGSettings
 from .index import RagIndex
-from .chain import ask
+from .chain import ask_stream
 
 # Sedikit CSS untuk chips sitasi
 CHAT_CSS = """
@@ -67,16 +67,22 @@ def render_chatbot_panel(settings: RAGSettings, index: RagIndex):
     if prompt:
         st.session_state["rag_msgs"].append({"role": "user", "content": prompt})
         st.session_state["rag_busy"] = True
+        with st.chat_message("user", avatar="🧑"):
+            st.markdown(prompt)
         try:
-            ans, cites = ask(
-                index=index,
-                settings=settings,
-                query=prompt,
-                k=6,
-                history=_history_for_chain()  # kirim riwayat → follow-up paham
-            )
+            with st.chat_message("assistant", avatar="🤖"):
+                stream, cites = ask_stream(
+                    index=index,
+                    settings=settings,
+                    query=prompt,
+                    k=6,
+                    history=_history_for_chain()  # kirim riwayat → follow-up paham
+                )
+                # render bertahap: teks muncul begitu token pertama diterima
+                ans = st.write_stream(stream)
             st.session_state["rag_msgs"].append(
-                {"role": "assistant", "content": ans, "citations": cites}
+                {"role": "assistant", "content": ans if isinstance(ans, str) else "".join(map(str, ans)),
+                 "citations": cites}
             )
         except Exception as e:
             st.session_state["rag_msgs"].append(
@@ -1,8 +1,10 @@
-import os, numpy as np, pandas as pd, joblib
+import os, time, threading, numpy as np, pandas as pd, joblib
 from pathlib import Path
-from scipy.sparse import load_npz
-from sklearn.metrics.pairwise import cosine_similarity
+from cachetools import TTLCache
+from scipy.sparse import load_npz, save_npz, csr_matrix
+from sklearn.preprocessing import normalize
 import warnings
+from cf_incremental import IncrementalCF
 
 try:
     from sklearn.exceptions import InconsistentVersionWarning
@@ -11,6 +13,116 @@ except Exception:
         pass
 
 
+# Kolom metadata yang dikembalikan bersama hasil rekomendasi
+_META_COLS = ["place_name", "city", "category", "price", "rating", "image"]
+
+# Nama artefak opsional
+CF_SIM_F32 = "cf_item_sim_f32.npy"
+CF_NEIGHBORS = "cf_item_neighbors.npz"
+CBF_NEIGHBORS = "cbf_item_neighbors.npz"
+
+
+def _topn_csr(blocks, n_rows: int, n_cols: int, top_n: int | None = None):
+    """
+    Rakit CSR dari blok baris dense [(start, block), ...], menyimpan top_n nilai terbesar per baris
+    (top_n=None → semua nilai non-nol).
+    """
+    rows, cols, vals = [], [], []
+    for start, block in blocks:
+        block = np.asarray(block)
+        if top_n is not None and 0 < top_n < n_cols:
+            idx = np.argpartition(-block, kth=top_n - 1, axis=1)[:, :top_n]
+        else:
+            idx = np.broadcast_to(np.arange(n_cols), block.shape)
+        v = np.take_along_axis(block, idx, axis=1)
+        keep = v != 0
+        r = np.broadcast_to(np.arange(start, start + block.shape[0])[:, None], idx.shape)
+        rows.append(r[keep]); cols.append(idx[keep]); vals.append(v[keep])
+    if not rows:
+        return csr_matrix((n_rows, n_cols), dtype=float)
+    return csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, n_cols),
+    )
+
+
+def build_cbf_neighbors(X, top_n: int | None = None, block_size: int = 1024):
+    """
+    Bangun matriks kemiripan cosine item-item (CSR) dari matriks fitur CBF.
+    - top_n=None → simpan semua tetangga (hasil identik dengan cosine_similarity per item).
+    - top_n=N   → tiap baris hanya menyimpan N tetangga termirip (pruned).
+    Dihitung per blok baris agar memori tetap terkendali untuk katalog besar.
+    """
+    Xn = normalize(csr_matrix(X), norm="l2", axis=1)
+    n = Xn.shape[0]
+    XnT = Xn.T.tocsc()
+    blocks = (
+        (start, (Xn[start:start + block_size] @ XnT).todense())
+        for start in range(0, n, block_size)
+    )
+    return _topn_csr(blocks, n, n, top_n=top_n)
+
+
+def build_cf_neighbors(item_sim, top_n: int, block_size: int = 1024):
+    """Pangkas matriks CF dense item-item menjadi CSR dengan top_n tetangga per item."""
+    n_rows, n_cols = item_sim.shape
+    blocks = ((start, item_sim[start:start + block_size]) for start in range(0, n_rows, block_size))
+    return _topn_csr(blocks, n_rows, n_cols, top_n=top_n)
+
+
+def export_cf_neighbors(cf_dir: str, top_n: int = 50) -> Path:
+    """Konversi `cf_item_sim.npy` (dense) ke artefak sparse `cf_item_neighbors.npz` (top_n per item)."""
+    cf_dir = Path(cf_dir)
+    out_p = cf_dir / CF_NEIGHBORS
+    sim = np.load(cf_dir / "cf_item_sim.npy", mmap_mode="r")
+    save_npz(out_p, build_cf_neighbors(sim, top_n=top_n))
+    return out_p
+
+
+def export_cbf_neighbors(cbf_dir: str, top_n: int | None = None) -> Path:
+    """Simpan indeks tetangga CBF sebagai artefak `cbf_item_neighbors.npz` di cbf_dir."""
+    cbf_dir = Path(cbf_dir)
+    X = load_npz(cbf_dir / "cbf_item_matrix.npz")
+    out_p = cbf_dir / CBF_NEIGHBORS
+    save_npz(out_p, build_cbf_neighbors(X, top_n=top_n))
+    return out_p
+
+
+def export_cf_float32(cf_dir: str) -> Path:
+    """Konversi `cf_item_sim.npy` ke float32 (`cf_item_sim_f32.npy`) agar bisa di-mmap langsung."""
+    cf_dir = Path(cf_dir)
+    out_p = cf_dir / CF_SIM_F32
+    tmp_p = cf_dir / (CF_SIM_F32 + ".tmp.npy")
+    np.save(tmp_p, np.load(cf_dir / "cf_item_sim.npy", mmap_mode="r").astype(np.float32))
+    os.replace(tmp_p, out_p)
+    return out_p
+
+
+def _lookup_ids(sorted_keys: np.ndarray, sorted_vals: np.ndarray, pids: np.ndarray) -> np.ndarray:
+    """Map place_id → indeks (vectorized via searchsorted). ID yang tidak dikenal → -1."""
+    if sorted_keys.size == 0 or pids.size == 0:
+        return np.full(pids.shape, -1, dtype=np.int64)
+    pos = np.searchsorted(sorted_keys, pids)
+    pos = np.clip(pos, 0, sorted_keys.size - 1)
+    hit = sorted_keys[pos] == pids
+    return np.where(hit, sorted_vals[pos], -1)
+
+
+def _id_index(ids) -> tuple[np.ndarray, np.ndarray]:
+    """Bangun pasangan (keys terurut, posisi) untuk _lookup_ids dari daftar ID berurutan."""
+    keys = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    return keys[order], order.astype(np.int64)
+
+
+def _norm01_rows(M: np.ndarray) -> np.ndarray:
+    """Min-max per baris ke [0, 1]; baris konstan/non-finite → 0."""
+    mn = np.nanmin(M, axis=1, keepdims=True)
+    mx = np.nanmax(M, axis=1, keepdims=True)
+    ok = np.isfinite(mn) & np.isfinite(mx) & (mx - mn >= 1e-9)
+    return np.where(ok, (M - mn) / (mx - mn + 1e-9), 0.0)
+
+
 class RecommenderService:
     """
     Loader artefak CBF/CF + fungsi rekomendasi.
@@ -18,9 +130,17 @@ class RecommenderService:
     - Menerima kolom id, place_id, atau Unnamed: 0. Jika tidak ada, gunakan place_id_order dari artefak.
     - Casting id & rating aman (filter baris di DataFrame, bukan dropna di Series).
     - Fallback kolom price/image, dan default kolom wajib (place_name, city, category, price, image).
+    - Kemiripan CBF item-item dihitung sekali saat load (atau dibaca dari `cbf_item_neighbors.npz`),
+      sehingga skor CBF per user cukup satu perkalian sparse matriks-vektor.
+    - cf_mmap/cf_float32: matriks CF dibaca via mmap (dibagi antar proses lewat page cache)
+      dan/atau sebagai float32 (`cf_item_sim_f32.npy`, lihat export_cf_float32).
+    - cf_sparse: pakai artefak CF sparse top-N (`cf_item_neighbors.npz`, lihat export_cf_neighbors),
+      biaya skor CF ~ jumlah item yang dirating × N, bukan item².
     """
 
-    def __init__(self, cbf_dir: str, cf_dir: str, fallback_data_dir: str | None = None):
+    def __init__(self, cbf_dir: str, cf_dir: str, fallback_data_dir: str | None = None,
+                 cbf_top_n: int | None = None, cf_mmap: bool = False, cf_float32: bool = False,
+                 cf_sparse: bool = False):
         self.cbf_dir = Path(cbf_dir)
         self.cf_dir = Path(cf_dir)
         self.fallback_data_dir = Path(fallback_data_dir) if fallback_data_dir else None
@@ -28,11 +148,28 @@ class RecommenderService:
         self.places_df: pd.DataFrame | None = None
         self.place_id_order: list[int] = []
         self.X = None
+        self.cbf_top_n = cbf_top_n
+        self.cbf_sim = None
+        self._meta: pd.DataFrame | None = None      # metadata UI, index = id (read-only)
+        self._meta_cf: pd.DataFrame | None = None   # _meta yang di-align ke urutan item_ids
 
+        self.cf_mmap = cf_mmap
+        self.cf_float32 = cf_float32
+        self.cf_sparse = cf_sparse
         self.item_sim = None
+        self._cf_sim_T = None                      # transpose item_sim (view untuk dense, CSR untuk sparse)
+        self._cf_updater: IncrementalCF | None = None
+        self._cf_lock = threading.Lock()    # updater dibuat sekali walau beberapa sesi menyimpan rating bersamaan
+        self._cf_phys: np.ndarray | None = None    # kolom item_ids → baris/kolom fisik item_sim
         self.item_ids: list[int] = []
         self.item_to_col: dict[int, int] = {}
 
+        # Peta ID → indeks (dibangun sekali saat load, lihat _build_id_maps)
+        self._cf_keys = self._cf_vals = np.zeros(0, dtype=np.int64)
+        self._cbf_keys = self._cbf_vals = np.zeros(0, dtype=np.int64)
+        self._cbf_to_cf = np.zeros(0, dtype=np.int64)
+        self._cbf_to_cf_valid = np.zeros(0, dtype=bool)
+
         self._load_all()
 
     # ---------- Public ----------
@@ -52,70 +189,208 @@ class RecommenderService:
         return df[keep]
 
     def recommend_hybrid_for_user(self, user_ratings: dict, k=20, alpha=0.6):
-        # --- CF score ---
-        s_cf = np.zeros(len(self.item_ids), dtype=float)
-        if self.item_sim is not None and len(self.item_ids) > 0:
-            v = np.zeros(len(self.item_ids), dtype=float)
-            for pid, r in (user_ratings or {}).items():
-                j = self.item_to_col.get(int(pid))
-                if j is not None:
-                    v[j] = float(r)
-            s_cf = self.item_sim.dot(v)
-
-        # --- CBF score ---
-        s_cbf = np.zeros(len(self.place_id_order), dtype=float)
-        if self.X is not None and len(self.place_id_order) == self.X.shape[0]:
-            pid_to_row = {pid: i for i, pid in enumerate(self.place_id_order)}
-            for pid, r in (user_ratings or {}).items():
-                i = pid_to_row.get(int(pid))
-                if i is not None:
-                    sims = cosine_similarity(self.X[i], self.X).ravel()
-                    s_cbf += sims * float(r)
-
-        # --- Mask seen ---
-        seen_cols = set()
-        for pid in (user_ratings or {}):
-            j = self.item_to_col.get(int(pid))
-            if j is not None:
-                seen_cols.add(j)
-
-        # Align CBF → CF order
-        pid_to_row = {pid: i for i, pid in enumerate(self.place_id_order)}
-        s_cbf_aligned = np.zeros_like(s_cf)
-        for idx, pid in enumerate(self.item_ids):
-            i = pid_to_row.get(pid)
-            if i is not None:
-                s_cbf_aligned[idx] = s_cbf[i]
-
-        # Normalize & blend
-        def norm01(x):
-            mn, mx = np.nanmin(x), np.nanmax(x)
-            if not np.isfinite(mn) or not np.isfinite(mx) or mx - mn < 1e-9:
-                return np.zeros_like(x)
-            return (x - mn) / (mx - mn + 1e-9)
-
-        s = alpha * norm01(s_cf) + (1 - alpha) * norm01(s_cbf_aligned)
-        for j in seen_cols:
-            s[j] = -np.inf
+        s = self.score_hybrid_for_user(user_ratings, alpha=alpha)
 
         # Top-K
         k = min(k, len(s) - 1) if len(s) > 1 else 1
         top_idx = np.argpartition(-s, kth=k - 1)[:k]
         top_idx = top_idx[np.argsort(-s[top_idx])]
-        top_pids = [self.item_ids[j] for j in top_idx]
-
-        # Kembalikan metadata siap UI
-        cols = ["place_name", "city", "category", "price", "rating", "image"]
-        for c in cols:
-            if c not in self.places_df.columns:
-                self.places_df[c] = "" if c != "rating" else 0.0
-        meta = (
-            self.places_df.set_index("id")
-            .reindex(top_pids)[cols]
-            .reset_index()
-            .rename(columns={"index": "place_id"})
-        )
-        meta["hybrid_score"] = np.array(s[top_idx]).round(4)
+        return self._result_frame(top_idx, s[top_idx])
+
+    def recommend_page(self, user_ratings: dict, offset: int = 0, limit: int = 12, alpha=0.6,
+                       scores: np.ndarray | None = None) -> tuple[pd.DataFrame, int]:
+        """
+        Satu halaman rekomendasi: (DataFrame item ke offset..offset+limit, total kandidat).
+        `scores` (hasil score_hybrid_for_user) bisa di-cache pemanggil agar pindah halaman
+        hanya butuh argpartition untuk jendela yang diminta + metadata item yang tampil.
+        Item yang sudah dirating tidak ikut dihitung sebagai kandidat.
+        """
+        s = self.score_hybrid_for_user(user_ratings, alpha=alpha) if scores is None else scores
+        total = self.candidate_count(s)
+        offset = max(0, int(offset))
+        stop = min(offset + max(0, int(limit)), total)
+        if stop <= offset:
+            return self._result_frame(np.zeros(0, dtype=np.int64), []), total
+
+        # Urutan global deterministik (skor desc, indeks asc) agar halaman tidak tumpang tindih saat skor seri
+        t = s[np.argpartition(-s, kth=stop - 1)[stop - 1]]
+        above = np.flatnonzero(s > t)
+        above = above[np.lexsort((above, -s[above]))]
+        ties = np.flatnonzero(s == t)[: stop - above.size]
+        window = np.concatenate([above, ties])[offset:stop]
+        return self._result_frame(window, s[window]), total
+
+    @staticmethod
+    def candidate_count(scores: np.ndarray) -> int:
+        """Jumlah item yang bisa direkomendasikan (skor finite, bukan item yang sudah dirating)."""
+        return int(np.isfinite(scores).sum())
+
+    def score_hybrid_for_user(self, user_ratings: dict, alpha=0.6) -> np.ndarray:
+        """Skor hybrid untuk semua item (urutan item_ids); item yang sudah dirating = -inf."""
+        n_items = len(self.item_ids)
+        pids, rs = self._ratings_arrays(user_ratings)
+        cf_cols = _lookup_ids(self._cf_keys, self._cf_vals, pids)
+        cf_ok = cf_cols >= 0
+
+        # --- CF score ---
+        s_cf = np.zeros(n_items, dtype=float)
+        if self.item_sim is not None and n_items > 0:
+            v = csr_matrix((rs[cf_ok], (np.zeros(int(cf_ok.sum()), dtype=np.int64), cf_cols[cf_ok])),
+                           shape=(1, n_items))
+            s_cf = self._cf_scores(v)[0]
+
+        # --- CBF score, langsung di-align ke urutan CF ---
+        s_cbf_aligned = np.zeros_like(s_cf)
+        if self._cbf_ready():
+            rows = _lookup_ids(self._cbf_keys, self._cbf_vals, pids)
+            ok = rows >= 0
+            u = np.zeros(len(self.place_id_order), dtype=float)
+            u[rows[ok]] = rs[ok]
+            # s_cbf[j] = sum_i r_i * sim(i, j)
+            s_cbf = np.asarray(self.cbf_sim.T.dot(u)).ravel()
+            s_cbf_aligned[self._cbf_to_cf_valid] = s_cbf[self._cbf_to_cf[self._cbf_to_cf_valid]]
+
+        # Normalize & blend, lalu mask item yang sudah dirating
+        s = alpha * _norm01_rows(s_cf[None, :])[0] + (1 - alpha) * _norm01_rows(s_cbf_aligned[None, :])[0]
+        s[cf_cols[cf_ok]] = -np.inf
+        return s
+
+    def recommend_hybrid_batch(self, users: dict, k=20, alpha=0.6, chunk_size: int = 512) -> dict:
+        """
+        Versi batch dari recommend_hybrid_for_user.
+        users: {user_id: {place_id: rating}} → {user_id: DataFrame top-k}.
+        User diproses per blok `chunk_size`; dalam satu blok semua user ditumpuk menjadi satu
+        matriks sparse user×item sehingga skor CF & CBF dihitung sekaligus (hasil per user identik
+        dengan versi per-user). Memori puncak ~ chunk_size × jumlah item, bukan jumlah user × item.
+        """
+        user_keys = list((users or {}).keys())
+        n_items = len(self.item_ids)
+        if not user_keys or n_items == 0:
+            return {uid: self.recommend_hybrid_for_user(users[uid], k=k, alpha=alpha) for uid in user_keys}
+
+        chunk_size = max(1, int(chunk_size))
+        out = {}
+        for start in range(0, len(user_keys), chunk_size):
+            block = user_keys[start:start + chunk_size]
+            out.update(self._hybrid_batch_block(users, block, k, alpha))
+        return out
+
+    def _hybrid_batch_block(self, users: dict, user_keys: list, k, alpha) -> dict:
+        n_items = len(self.item_ids)
+        n_users = len(user_keys)
+        per_user = [self._ratings_arrays(users[uid]) for uid in user_keys]
+        u_idx = np.repeat(np.arange(n_users), [len(p) for p, _ in per_user])
+        pids = np.concatenate([p for p, _ in per_user]) if per_user else np.zeros(0, dtype=np.int64)
+        rs = np.concatenate([r for _, r in per_user]) if per_user else np.zeros(0, dtype=float)
+
+        cf_cols = _lookup_ids(self._cf_keys, self._cf_vals, pids)
+        cf_ok = cf_cols >= 0
+        U_cf = csr_matrix((rs[cf_ok], (u_idx[cf_ok], cf_cols[cf_ok])), shape=(n_users, n_items))
+
+        # --- CF score (item_sim.dot(v) untuk setiap baris user) ---
+        S_cf = np.zeros((n_users, n_items), dtype=float)
+        if self.item_sim is not None:
+            S_cf = self._cf_scores(U_cf)
+
+        # --- CBF score, langsung di-align ke urutan CF ---
+        S_cbf = np.zeros((n_users, n_items), dtype=float)
+        if self._cbf_ready():
+            rows = _lookup_ids(self._cbf_keys, self._cbf_vals, pids)
+            ok = rows >= 0
+            U_cbf = csr_matrix((rs[ok], (u_idx[ok], rows[ok])), shape=(n_users, len(self.place_id_order)))
+            S_full = np.asarray((U_cbf @ self.cbf_sim).todense())
+            valid = self._cbf_to_cf_valid
+            S_cbf[:, valid] = S_full[:, self._cbf_to_cf[valid]]
+
+        S = alpha * _norm01_rows(S_cf) + (1 - alpha) * _norm01_rows(S_cbf)
+        S[u_idx[cf_ok], cf_cols[cf_ok]] = -np.inf
+
+        # Top-K per user
+        k = min(k, n_items - 1) if n_items > 1 else 1
+        top_idx = np.argpartition(-S, kth=k - 1, axis=1)[:, :k]
+        top_s = np.take_along_axis(S, top_idx, axis=1)
+        order = np.argsort(-top_s, axis=1)
+        top_idx = np.take_along_axis(top_idx, order, axis=1)
+        top_s = np.take_along_axis(top_s, order, axis=1)
+        return {uid: self._result_frame(top_idx[u], top_s[u]) for u, uid in enumerate(user_keys)}
+
+    def sync_cf_ratings(self, ratings) -> int:
+        """
+        Sinkronkan kemiripan CF dengan SEMUA rating live: ratings = iterable (user_id, place_id, rating)
+        berisi seluruh tabel `ratings` (dipakai sekali saat model dimuat). Hanya item yang ratingnya
+        berubah sejak sync terakhir yang dihitung ulang (lihat IncrementalCF).
+        Mengembalikan jumlah item yang di-refresh.
+        """
+        return self._update_cf(ratings, full=True)
+
+    def apply_cf_ratings(self, changes, background: bool = True) -> int:
+        """
+        Terapkan delta rating yang baru disimpan saja: changes = iterable (user_id, place_id, rating).
+        background=True: salin + tukar matriks dikerjakan worker thread updater, bukan thread request.
+        """
+        return self._update_cf(changes, full=False, background=background)
+
+    def cf_incremental_supported(self) -> bool:
+        # mmap (dibagi antar proses, read-only) & CF sparse top-N tidak di-update inkremental
+        return self.item_sim is not None and bool(self.item_ids) and not (self.cf_mmap or self.cf_sparse)
+
+    def _update_cf(self, rows, full: bool, background: bool = False) -> int:
+        if not self.cf_incremental_supported():
+            return 0
+        with self._cf_lock:
+            if self._cf_updater is None:
+                updater = IncrementalCF.from_artifacts(self.cf_dir, item_sim=self.item_sim,
+                                                       on_update=self._swap_cf_sim)
+                if updater.n_items != self.item_sim.shape[0]:
+                    raise ValueError("ui_matrix_csr.npz tidak cocok dengan dimensi matriks CF")
+                self._cf_updater = updater
+
+        rows = list(rows)
+        pids = np.fromiter((int(p) for _, p, _ in rows), dtype=np.int64, count=len(rows))
+        cols = _lookup_ids(self._cf_keys, self._cf_vals, pids)
+        if self._cf_phys is not None:
+            cols = np.where(cols >= 0, self._cf_phys[np.maximum(cols, 0)], -1)
+        mapped = [(u, int(c), r) for (u, _, r), c in zip(rows, cols) if c >= 0]
+        if full:
+            changed = self._cf_updater.sync(mapped)
+        else:
+            changed = self._cf_updater.apply(mapped, background=background)
+        return int(changed.size)
+
+    def _swap_cf_sim(self, sim) -> None:
+        # dipanggil updater setelah matriks baru selesai disusun (copy-on-write) → cukup tukar referensi
+        self._cf_sim_T = sim.T
+        self.item_sim = sim
+
+    @staticmethod
+    def _ratings_arrays(user_ratings: dict | None):
+        items = list((user_ratings or {}).items())
+        pids = np.fromiter((int(p) for p, _ in items), dtype=np.int64, count=len(items))
+        rs = np.fromiter((float(r) for _, r in items), dtype=float, count=len(items))
+        return pids, rs
+
+    def _cf_scores(self, U) -> np.ndarray:
+        """
+        Skor CF untuk matriks sparse user×item (urutan item_ids): setara dengan item_sim.dot(v) per baris.
+        item_sim disimpan dalam urutan fisik artefak; alignment dilakukan lewat _cf_phys
+        (index array) sehingga matriks tidak pernah disalin (aman untuk mmap).
+        """
+        if self._cf_phys is not None:
+            U = U.tocoo()
+            U = csr_matrix((U.data, (U.row, self._cf_phys[U.col])), shape=(U.shape[0], self.item_sim.shape[0]))
+        S = U @ self._cf_sim_T
+        S = S.toarray() if hasattr(S, "toarray") else np.asarray(S)
+        if self._cf_phys is not None:
+            S = S[:, self._cf_phys]
+        return S.astype(float, copy=False)
+
+    def _cbf_ready(self) -> bool:
+        return self.cbf_sim is not None and len(self.place_id_order) == self.cbf_sim.shape[0]
+
+    def _result_frame(self, top_idx, scores) -> pd.DataFrame:
+        # Ambil metadata siap UI dengan integer take dari store yang sudah di-align ke urutan CF
+        meta = self._meta_cf.take(np.asarray(top_idx, dtype=np.int64)).reset_index()
+        meta["hybrid_score"] = np.array(scores).round(4)
         return meta
 
     # ---------- Loaders ----------
@@ -123,6 +398,23 @@ class RecommenderService:
         self._load_cbf()
         self._load_cf()
         self._sanity_align_ids()
+        self._build_id_maps()
+
+    def _build_id_maps(self):
+        # place_id → kolom CF (mengikuti item_to_col) & place_id → baris CBF
+        cf_pids = np.fromiter((int(p) for p in self.item_to_col), dtype=np.int64, count=len(self.item_to_col))
+        cf_cols = np.fromiter(self.item_to_col.values(), dtype=np.int64, count=len(self.item_to_col))
+        order = np.argsort(cf_pids, kind="stable")
+        self._cf_keys, self._cf_vals = cf_pids[order], cf_cols[order]
+        self._cbf_keys, self._cbf_vals = _id_index(self.place_id_order)
+
+        # Alignment CBF → CF: baris CBF untuk tiap kolom CF (+ mask validitas)
+        item_ids = np.asarray(self.item_ids, dtype=np.int64)
+        self._cbf_to_cf = _lookup_ids(self._cbf_keys, self._cbf_vals, item_ids)
+        self._cbf_to_cf_valid = self._cbf_to_cf >= 0
+
+        # Metadata per kolom CF, sehingga top-k cukup .take(top_idx)
+        self._meta_cf = self._meta.reindex(self.item_ids)
 
     def _load_cbf(self):
         mat_p = self.cbf_dir / "cbf_item_matrix.npz"
@@ -204,24 +496,60 @@ class RecommenderService:
 
         self.places_df = df
 
+        # Store metadata UI (kolom tetap, index = id) — dibangun sekali, tidak dimutasi per request
+        meta = df.drop_duplicates(subset="id").set_index("id")
+        self._meta = meta[_META_COLS].copy()
+
         # Sinkronisasi panjang X vs metadata (jika perlu)
         if self.X.shape[0] != len(self.place_id_order):
             # kalau artefak tidak simetris, minimal pastikan mapping tetap konsisten
             self.place_id_order = self.place_id_order[: self.X.shape[0]]
 
+        self._load_cbf_neighbors()
+
+    def _load_cbf_neighbors(self):
+        nb_p = self.cbf_dir / CBF_NEIGHBORS
+        n = self.X.shape[0]
+        if nb_p.exists():
+            sim = load_npz(nb_p).tocsr()
+            if sim.shape == (n, n):
+                self.cbf_sim = sim
+                return
+        self.cbf_sim = build_cbf_neighbors(self.X, top_n=self.cbf_top_n)
+
     def _load_cf(self):
-        sim_p = self.cf_dir / "cf_item_sim.npy"
+        sim_p = self.cf_dir / (CF_NEIGHBORS if self.cf_sparse else "cf_item_sim.npy")
         art_p = self.cf_dir / "cf_artifacts.joblib"
         if not (sim_p.exists() and art_p.exists()):
             raise FileNotFoundError(f"Artefak CF tidak ditemukan di {self.cf_dir}")
 
-        self.item_sim = np.load(sim_p)
+        if self.cf_sparse:
+            sim = load_npz(sim_p).tocsr()
+            self.item_sim = sim.astype(np.float32) if self.cf_float32 else sim
+            self._cf_sim_T = self.item_sim.T.tocsr()
+        else:
+            self.item_sim = self._load_cf_sim(sim_p)
+            self._cf_sim_T = self.item_sim.T
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", InconsistentVersionWarning)
             obj = joblib.load(art_p)
         self.item_ids = list(obj.get("item_ids", []))
         self.item_to_col = dict(obj.get("item_to_col", {}))
 
+    def _load_cf_sim(self, sim_p: Path):
+        mmap_mode = "r" if self.cf_mmap else None
+        if self.cf_float32:
+            f32_p = self.cf_dir / CF_SIM_F32
+            if f32_p.exists():
+                return np.load(f32_p, mmap_mode=mmap_mode)
+            if self.cf_mmap:
+                # astype akan menyalin seluruh matriks → tetap mmap float64
+                warnings.warn(f"{CF_SIM_F32} tidak ada; CF dibaca sebagai float64 (mmap). "
+                              "Jalankan export_cf_float32() untuk membuatnya.")
+                return np.load(sim_p, mmap_mode=mmap_mode)
+            return np.load(sim_p).astype(np.float32)
+        return np.load(sim_p, mmap_mode=mmap_mode)
+
     def _sanity_align_ids(self):
         if self.places_df is None:
             return
@@ -231,6 +559,112 @@ class RecommenderService:
         keep_mask = np.array([pid in valid_ids for pid in self.item_ids], dtype=bool)
         if keep_mask.size and (not keep_mask.all()):
             idx = np.where(keep_mask)[0]
-            self.item_sim = self.item_sim[np.ix_(idx, idx)]
+            # simpan sebagai index view, bukan salinan np.ix_ (item_sim bisa berupa mmap)
+            self._cf_phys = idx.astype(np.int64)
             self.item_ids = [self.item_ids[i] for i in idx]
             self.item_to_col = {pid: j for j, pid in enumerate(self.item_ids)}
+
+
+def ratings_version(user_ratings: dict | None) -> int:
+    """Fingerprint rating user (urutan tidak berpengaruh) → bagian dari kunci cache."""
+    return hash(frozenset((int(p), float(r)) for p, r in (user_ratings or {}).items()))
+
+
+class RecommendationCache:
+    """
+    Cache hasil rekomendasi per user (LRU + TTL), kunci = (user_id, ratings_version, parameter).
+    - Rating user berubah → ratings_version berubah → entry lama otomatis tidak terpakai.
+    - invalidate_user() dipanggil handler rating/onboarding agar entry lama langsung dibuang.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, user_id, user_ratings: dict, compute, **params):
+        key = (user_id, ratings_version(user_ratings), tuple(sorted(params.items())))
+        with self._lock:
+            val = self._cache.get(key)
+            if val is not None:
+                self.hits += 1
+                return val
+            self.misses += 1
+        val = compute()
+        with self._lock:
+            self._cache[key] = val
+        return val
+
+    def invalidate_user(self, user_id) -> None:
+        with self._lock:
+            for key in [k for k in list(self._cache.keys()) if k[0] == user_id]:
+                self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+class RecommenderReloader:
+    """
+    Pemegang RecommenderService yang dibagi satu proses (mis. via st.cache_resource).
+    get() mengecek mtime/ukuran file artefak (maks. sekali per check_interval detik);
+    jika berubah, service baru dibangun lalu ditukar secara atomik. Jika load gagal
+    (mis. deploy artefak belum selesai), service lama tetap dipakai; load baru dicoba lagi
+    hanya setelah file artefak berubah lagi (fingerprint percobaan gagal diingat).
+    """
+
+    def __init__(self, check_interval: float = 5.0, **service_kwargs):
+        self.service_kwargs = service_kwargs
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error: str = ""
+        self._lock = threading.Lock()
+        self._fingerprint = self._artifact_fingerprint()
+        self._failed_fp = None
+        self._service = RecommenderService(**service_kwargs)
+        self._checked_at = time.monotonic()
+
+    def get(self) -> RecommenderService:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked_at = now
+                fp = self._artifact_fingerprint()
+                if fp == self._fingerprint:
+                    self.last_error = ""
+                    self._failed_fp = None
+                elif fp != self._failed_fp:
+                    self._reload(fp)
+            finally:
+                self._lock.release()
+        return self._service
+
+    def _reload(self, fp) -> None:
+        try:
+            service = RecommenderService(**self.service_kwargs)
+        except Exception as e:
+            self.last_error = str(e)
+            self._failed_fp = fp  # jangan load ulang tiap check_interval untuk file yang sama
+            return
+        self._service = service
+        self._failed_fp = None
+        self._fingerprint = fp
+        self.version += 1
+        self.last_error = ""
+
+    def _artifact_fingerprint(self) -> tuple:
+        dirs = [self.service_kwargs.get("cbf_dir"), self.service_kwargs.get("cf_dir")]
+        out = []
+        for d in dirs:
+            if not d or not os.path.isdir(d):
+                continue
+            for name in sorted(os.listdir(d)):
+                p = os.path.join(d, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((p, st.st_mtime_ns, st.st_size))
+        return tuple(out)
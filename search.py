@@ -0,0 +1,390 @@
+import re, math, bisect, threading, hashlib, unicodedata
+import pandas as pd
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+from models import Place
+
+# Kolom yang diindeks untuk pencarian tempat
+SEARCH_COLS = ["place_name", "place_description", "city", "category"]
+
+_PG_DOC = ("coalesce(place_name, '') || ' ' || coalesce(place_description, '') || ' ' || "
+           "coalesce(city, '') || ' ' || coalesce(category, '')")
+_PG_TSV = f"to_tsvector('simple', {_PG_DOC})"
+
+
+def _tokens(s: str) -> list[str]:
+    return re.findall(r"\w+", (s or "").lower())
+
+
+# ---------- Normalisasi teks (Indonesia) untuk index in-memory ----------
+_ID_STOPWORDS = {
+    "di", "ke", "dari", "yang", "dan", "atau", "untuk", "dengan", "pada", "dalam", "ini", "itu",
+    "adalah", "juga", "ada", "sebagai", "oleh", "para", "the", "of", "and",
+}
+_ID_PARTICLES = ("nya", "lah", "kah", "pun")
+
+
+def normalize_tokens(s: str) -> list[str]:
+    """
+    Lowercase, buang diakritik, pecah per kata (kata ulang "pantai-pantai" → "pantai"),
+    buang stopword & partikel akhiran (-nya, -lah, -kah, -pun).
+    """
+    s = unicodedata.normalize("NFKD", str(s or "")).encode("ascii", "ignore").decode("ascii").lower()
+    out = []
+    for t in re.findall(r"[a-z0-9]+", s):
+        if t in _ID_STOPWORDS:
+            continue
+        for suf in _ID_PARTICLES:
+            if t.endswith(suf) and len(t) - len(suf) >= 4:
+                t = t[: -len(suf)]
+                break
+        out.append(t)
+    return out
+
+
+class PlaceSearchIndex:
+    """
+    Inverted index in-memory (token → posting list) untuk pencarian tempat tanpa FTS di DB.
+    - Field: place_name, place_description, city, category (berbobot, BM25F sederhana).
+    - Prefix matching: tiap token query dicocokkan ke semua token index yang berawalan sama.
+    - Filter kota/kategori: posting per field (token → set doc_id), di-irisan tanpa scan katalog.
+    - sync_frame(df, version): hanya baris yang berubah (hash field) yang di-index ulang.
+    """
+
+    FIELD_WEIGHTS = {"place_name": 3.0, "place_description": 1.0, "city": 2.0, "category": 2.0}
+    FILTER_FIELDS = ("city", "category")
+    K1, B = 1.2, 0.75
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, float]] = {}       # token → {doc_id: tf berbobot}
+        self._field_tokens: dict[int, dict[str, set]] = {}      # doc_id → {field: set token}
+        self._doc_terms: dict[int, set] = {}
+        self._doc_len: dict[int, float] = {}
+        self._doc_hash: dict[int, str] = {}
+        self._vocab: list[str] = []
+        self._field_postings: dict[str, dict[str, set]] = {f: {} for f in self.FILTER_FIELDS}  # field → token → doc_id
+        self._field_vocab: dict[str, list[str]] = {f: [] for f in self.FILTER_FIELDS}
+        self._total_len = 0.0
+        self._source_key = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    # ---------- Build / update ----------
+    def sync_frame(self, df, version=None) -> int:
+        """
+        Sinkronkan index dengan DataFrame tempat (kolom id + SEARCH_COLS). Return jumlah dokumen berubah.
+        version: penanda versi sumber (mis. RecommenderReloader.version); sama dengan sync terakhir → no-op.
+        Tanpa version dipakai fingerprint isi kolom.
+        """
+        if df is None:
+            return 0
+        key = ("version", version) if version is not None else ("content", self._frame_fingerprint(df))
+        if key == self._source_key:
+            return 0
+        docs = {}
+        for rec in df[["id"] + [c for c in SEARCH_COLS if c in df.columns]].to_dict("records"):
+            docs[int(rec["id"])] = {c: rec.get(c, "") for c in SEARCH_COLS}
+        with self._lock:
+            changed = 0
+            for doc_id in [d for d in self._doc_len if d not in docs]:
+                self._remove_locked(doc_id)
+                changed += 1
+            for doc_id, fields in docs.items():
+                h = self._hash(fields)
+                if self._doc_hash.get(doc_id) != h:
+                    self._remove_locked(doc_id)
+                    self._add_locked(doc_id, fields, h)
+                    changed += 1
+            if changed:
+                self._rebuild_vocab_locked()
+            self._source_key = key
+            return changed
+
+    def upsert(self, doc_id: int, fields: dict) -> None:
+        with self._lock:
+            self._remove_locked(int(doc_id))
+            self._add_locked(int(doc_id), fields, self._hash(fields))
+            self._rebuild_vocab_locked()
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove_locked(int(doc_id))
+            self._rebuild_vocab_locked()
+
+    # ---------- Query ----------
+    def search(self, q: str = "", city: str = "", category: str = "") -> list[tuple[int, float]]:
+        """Return [(doc_id, skor)] terurut skor desc, id asc."""
+        q_toks, city_toks, cat_toks = normalize_tokens(q), normalize_tokens(city), normalize_tokens(category)
+        with self._lock:
+            candidates = None
+            for field, toks in (("city", city_toks), ("category", cat_toks)):
+                post = self._field_postings[field]
+                for t in toks:
+                    docs = set()
+                    for term in self._expand_prefix(t, self._field_vocab[field]):
+                        docs |= post[term]
+                    candidates = docs if candidates is None else candidates & docs
+                    if not candidates:
+                        break
+
+            scores: dict[int, float] = {}
+            if q_toks:
+                n_docs = max(1, len(self._doc_len))
+                avg_len = (self._total_len / n_docs) or 1.0
+                matched_all = None
+                for t in q_toks:
+                    hit_docs: dict[int, float] = {}
+                    for term in self._expand_prefix(t):
+                        post = self._postings[term]
+                        idf = math.log(1 + (n_docs - len(post) + 0.5) / (len(post) + 0.5))
+                        for d, tf in post.items():
+                            norm = tf + self.K1 * (1 - self.B + self.B * self._doc_len[d] / avg_len)
+                            s = idf * tf * (self.K1 + 1) / norm
+                            if s > hit_docs.get(d, 0.0):
+                                hit_docs[d] = s
+                    for d, s in hit_docs.items():
+                        scores[d] = scores.get(d, 0.0) + s
+                    matched_all = set(hit_docs) if matched_all is None else matched_all & set(hit_docs)
+                docs = matched_all or set()
+                if candidates is not None:
+                    docs &= candidates
+                scores = {d: scores[d] for d in docs}
+            else:
+                docs = candidates if candidates is not None else set(self._doc_len)
+                scores = {d: 0.0 for d in docs}
+        return sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+
+    # ---------- Internal ----------
+    @staticmethod
+    def _hash(fields: dict) -> str:
+        raw = "\x1f".join(str(fields.get(c, "") or "") for c in SEARCH_COLS)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _frame_fingerprint(df) -> str:
+        cols = ["id"] + [c for c in SEARCH_COLS if c in df.columns]
+        hashed = pd.util.hash_pandas_object(df[cols].astype(str), index=False).to_numpy()
+        return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+    def _expand_prefix(self, prefix: str, vocab: list[str] | None = None) -> list[str]:
+        vocab = self._vocab if vocab is None else vocab
+        i = bisect.bisect_left(vocab, prefix)
+        out = []
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            out.append(vocab[i])
+            i += 1
+        return out
+
+    def _rebuild_vocab_locked(self) -> None:
+        self._vocab = sorted(self._postings)
+        self._field_vocab = {f: sorted(p) for f, p in self._field_postings.items()}
+
+    def _add_locked(self, doc_id: int, fields: dict, h: str) -> None:
+        tf: dict[str, float] = {}
+        field_toks = {}
+        length = 0.0
+        for field, w in self.FIELD_WEIGHTS.items():
+            toks = normalize_tokens(fields.get(field, ""))
+            field_toks[field] = set(toks)
+            length += w * len(toks)
+            for t in toks:
+                tf[t] = tf.get(t, 0.0) + w
+        for t, v in tf.items():
+            self._postings.setdefault(t, {})[doc_id] = v
+        for field in self.FILTER_FIELDS:
+            for t in field_toks[field]:
+                self._field_postings[field].setdefault(t, set()).add(doc_id)
+        self._field_tokens[doc_id] = field_toks
+        self._doc_terms[doc_id] = set(tf)
+        self._doc_len[doc_id] = length
+        self._doc_hash[doc_id] = h
+        self._total_len += length
+
+    def _remove_locked(self, doc_id: int) -> None:
+        if doc_id not in self._doc_len:
+            return
+        for t in self._doc_terms.pop(doc_id, ()):
+            post = self._postings.get(t)
+            if post is not None:
+                post.pop(doc_id, None)
+                if not post:
+                    del self._postings[t]
+        self._total_len -= self._doc_len.pop(doc_id)
+        field_toks = self._field_tokens.pop(doc_id, {})
+        for field in self.FILTER_FIELDS:
+            post = self._field_postings[field]
+            for t in field_toks.get(field, ()):
+                docs = post.get(t)
+                if docs is not None:
+                    docs.discard(doc_id)
+                    if not docs:
+                        del post[t]
+        self._doc_hash.pop(doc_id, None)
+
+
+def ensure_search_index(bind) -> str:
+    """
+    Siapkan index pencarian sesuai dialek, return nama backend:
+    - "fts5"    : SQLite FTS5 (external content `places_fts` + trigger sinkronisasi)
+    - "postgres": pg_trgm (GIN trigram) + GIN tsvector di atas kolom places
+    - "ilike"   : fallback tanpa index teks (filter ILIKE)
+    """
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        try:
+            with bind.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='places_fts'"
+                )).first()
+                if not exists:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE places_fts USING fts5("
+                        "place_name, place_description, city, category, "
+                        "content='places', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                    ))
+                cols = ", ".join(SEARCH_COLS)
+                new_vals = ", ".join(f"new.{c}" for c in SEARCH_COLS)
+                old_vals = ", ".join(f"old.{c}" for c in SEARCH_COLS)
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS places_fts_ai AFTER INSERT ON places BEGIN "
+                    f"INSERT INTO places_fts(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS places_fts_ad AFTER DELETE ON places BEGIN "
+                    f"INSERT INTO places_fts(places_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS places_fts_au AFTER UPDATE OF {cols} ON places BEGIN "
+                    f"INSERT INTO places_fts(places_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+                    f"INSERT INTO places_fts(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+                ))
+                if not exists:
+                    conn.execute(text("INSERT INTO places_fts(places_fts) VALUES ('rebuild')"))
+            return "fts5"
+        except Exception:
+            # SQLite tanpa modul FTS5
+            return "ilike"
+
+    if dialect == "postgresql":
+        try:
+            with bind.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for c in ("place_name", "city", "category"):
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_places_{c}_trgm ON places USING gin ({c} gin_trgm_ops)"
+                    ))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_places_search_tsv ON places USING gin (({_PG_TSV}))"))
+            return "postgres"
+        except Exception:
+            return "ilike"
+
+    return "ilike"
+
+
+def detect_search_backend(bind) -> str:
+    """Backend yang tersedia tanpa membuat index (dipakai bila ensure_search_index belum dipanggil)."""
+    if bind.dialect.name == "sqlite" and inspect(bind).has_table("places_fts"):
+        return "fts5"
+    return "ilike"
+
+
+def search_places(sess: Session, q: str = "", city: str = "", category: str = "", limit: int = 18,
+                  cursor: tuple | None = None, backend: str | None = None,
+                  memory_index: PlaceSearchIndex | None = None) -> tuple[list[Place], tuple | None]:
+    """
+    Cari tempat dengan hasil ber-ranking + keyset pagination.
+    cursor = (rank, id) item terakhir halaman sebelumnya (None → halaman pertama).
+    backend="memory" memakai memory_index (PlaceSearchIndex) lalu hanya memuat Place hasil dari DB.
+    Return (list Place sesuai urutan ranking, cursor halaman berikutnya atau None).
+    """
+    backend = backend or detect_search_backend(sess.get_bind())
+    limit = max(1, int(limit))
+    if backend == "memory" and memory_index is not None:
+        ranked = _search_memory(memory_index, q, city, category, limit + 1, cursor)
+    elif backend == "fts5" and (_tokens(q) or _tokens(city) or _tokens(category)):
+        ranked = _search_fts5(sess, q, city, category, limit + 1, cursor)
+    elif backend == "postgres" and _tokens(q):
+        ranked = _search_postgres(sess, q, city, category, limit + 1, cursor)
+    else:
+        ranked = _search_ilike(sess, q, city, category, limit + 1, cursor)
+
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    ids = [pid for pid, _ in ranked]
+    by_id = {p.id: p for p in sess.scalars(select(Place).where(Place.id.in_(ids)))} if ids else {}
+    rows = [by_id[pid] for pid in ids if pid in by_id]
+    next_cursor = (float(ranked[-1][1]), int(ranked[-1][0])) if (has_more and ranked) else None
+    return rows, next_cursor
+
+
+def _fts5_match(q: str, city: str, category: str) -> str:
+    parts = [" AND ".join(f'"{t}"*' for t in _tokens(q))] if _tokens(q) else []
+    for col, val in (("city", city), ("category", category)):
+        toks = _tokens(val)
+        if toks:
+            parts.append(f"{col} : (" + " AND ".join(f'"{t}"*' for t in toks) + ")")
+    return " AND ".join(f"({p})" for p in parts)
+
+
+def _search_fts5(sess, q, city, category, n, cursor):
+    # bm25: makin kecil makin relevan; bobot kolom nama > kota/kategori > deskripsi
+    sql = (
+        "SELECT id, rank FROM ("
+        "  SELECT rowid AS id, bm25(places_fts, 10.0, 1.0, 2.0, 2.0) AS rank"
+        "  FROM places_fts WHERE places_fts MATCH :match"
+        ") AS f"
+    )
+    params = {"match": _fts5_match(q, city, category), "n": n}
+    if cursor:
+        sql += " WHERE (f.rank > :r OR (f.rank = :r AND f.id > :id))"
+        params.update(r=cursor[0], id=cursor[1])
+    sql += " ORDER BY f.rank, f.id LIMIT :n"
+    return [(int(pid), float(r)) for pid, r in sess.execute(text(sql), params)]
+
+
+def _search_postgres(sess, q, city, category, n, cursor):
+    # ts_rank (prefix match) + similarity trigram pada nama; rank besar = relevan
+    tsq = " & ".join(f"{t}:*" for t in _tokens(q))
+    inner = (
+        f"SELECT id, (ts_rank({_PG_TSV}, to_tsquery('simple', :tsq)) + similarity(place_name, :q))::float8 AS rank "
+        f"FROM places WHERE ({_PG_TSV} @@ to_tsquery('simple', :tsq) OR place_name % :q)"
+    )
+    params = {"tsq": tsq, "q": q.strip(), "n": n}
+    if (city or "").strip():
+        inner += " AND city ILIKE :city"
+        params["city"] = f"%{city.strip()}%"
+    if (category or "").strip():
+        inner += " AND category ILIKE :cat"
+        params["cat"] = f"%{category.strip()}%"
+    sql = f"SELECT id, rank FROM ({inner}) AS f"
+    if cursor:
+        sql += " WHERE (f.rank < :r OR (f.rank = :r AND f.id > :id))"
+        params.update(r=cursor[0], id=cursor[1])
+    sql += " ORDER BY f.rank DESC, f.id LIMIT :n"
+    return [(int(pid), float(r)) for pid, r in sess.execute(text(sql), params)]
+
+
+def _search_memory(index: PlaceSearchIndex, q, city, category, n, cursor):
+    # rank disimpan negatif agar cursor konsisten dengan bm25 (makin kecil makin relevan)
+    ranked = [(d, -score) for d, score in index.search(q, city, category)]
+    if cursor:
+        r, last_id = cursor
+        i = bisect.bisect_right([(rk, d) for d, rk in ranked], (r, last_id))
+        ranked = ranked[i:]
+    return ranked[:n]
+
+
+def _search_ilike(sess, q, city, category, n, cursor):
+    stmt = select(Place.id)
+    if (q or "").strip():
+        stmt = stmt.where(Place.place_name.ilike(f"%{q.strip()}%"))
+    if (city or "").strip():
+        stmt = stmt.where(Place.city.ilike(f"%{city.strip()}%"))
+    if (category or "").strip():
+        stmt = stmt.where(Place.category.ilike(f"%{category.strip()}%"))
+    if cursor:
+        stmt = stmt.where(Place.id > cursor[1])
+    stmt = stmt.order_by(Place.id).limit(n)
+    return [(int(pid), 0.0) for pid in sess.scalars(stmt)]
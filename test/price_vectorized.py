@@ -0,0 +1,125 @@
+# price_vectorized.py — Fuzz: versi vectorized harga (utils.*_series) vs versi skalar
+# Usage (dari root project):
+#   python test/price_vectorized.py
+#   python test/price_vectorized.py --n 50000 --seed 7
+#
+# Tiap elemen hasil parse_price_idr_series / format_price_idr_series / display_price_series
+# harus identik dengan parse_price_idr / format_price_idr / display_price.
+# Exit code 1 jika ada perbedaan (contoh pertama dicetak).
+
+import os, sys, math, random, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from utils import (
+    parse_price_idr, parse_price_idr_series,
+    format_price_idr, format_price_idr_series,
+    display_price, display_price_series,
+)
+
+EDGE_STR = [
+    None, "", " ", "-", "n/a", "NA", "Gratis", "free entry", "Donasi sukarela", "FREE",
+    "Rp10.000", "Rp 10.000", "10k", "10 K", "25rb", "25 ribu", "1jt", "1,5 juta", "Rp1.000.000",
+    "Rp 5.000 - 10.000", "anak 5rb, dewasa 10rb", "kbr", "5000k", "12345678901234567890",
+    "99999999999999999999 jt", "abc", "   Rp 7.500  ", "０１２", "nan", "None",
+]
+EDGE_NUM = [
+    None, np.nan, 0, 0.0, -1, 0.4, 0.5, 1.5, 2.5, 999.5, 1000, 12345.678, -12345.5,
+    1e15, 1e18, 2.0 ** 62, 2.0 ** 63, 1e20, -1e20, np.inf, -np.inf,
+]
+UNITS = ["", "k", "rb", "ribu", "jt", "juta", "K", "RB", " ribu", " juta"]
+WORDS = ["Rp", "rp ", "IDR ", "tiket ", "dewasa ", "anak ", "gratis ", "free ", "kbr ", "jtk "]
+
+
+def rand_price_str(rng: random.Random):
+    r = rng.random()
+    if r < 0.15:
+        return rng.choice(EDGE_STR)
+    num = str(rng.randint(0, 10 ** rng.randint(1, 22)))
+    if rng.random() < 0.4:
+        num = f"{int(num):,}".replace(",", rng.choice([".", ","]))
+    s = rng.choice(WORDS) * (rng.random() < 0.5) + num + rng.choice(UNITS)
+    if rng.random() < 0.2:
+        s = s + " - " + str(rng.randint(0, 99999)) + rng.choice(UNITS)
+    if rng.random() < 0.2:
+        s = " " * rng.randint(0, 3) + s.upper() + " " * rng.randint(0, 3)
+    return s
+
+
+def rand_price_num(rng: random.Random):
+    r = rng.random()
+    if r < 0.15:
+        return rng.choice(EDGE_NUM)
+    if r < 0.5:
+        return rng.randint(-10, 10 ** rng.randint(1, 12))
+    if r < 0.8:
+        return round(rng.uniform(-1000, 1e7), rng.randint(0, 3))
+    return rng.uniform(0, 10) + 0.5  # sekitar .5 → cek pembulatan banker's (round)
+
+
+def same(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def check(name, got: pd.Series, expected: list, inputs: list) -> int:
+    got = list(got)
+    if len(got) != len(expected):
+        print(f"[FAIL] {name}: panjang {len(got)} != {len(expected)}")
+        return 1
+    bad = [i for i, (g, e) in enumerate(zip(got, expected)) if not same(g, e)]
+    if bad:
+        i = bad[0]
+        print(f"[FAIL] {name}: {len(bad)} beda; contoh input={inputs[i]!r} series={got[i]!r} skalar={expected[i]!r}")
+        return 1
+    print(f"[OK]   {name}: {len(got)} elemen")
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000, help="Jumlah elemen acak per fungsi (default 20000)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    strs = EDGE_STR + [rand_price_str(rng) for _ in range(args.n)]
+    nums = EDGE_NUM + [rand_price_num(rng) for _ in range(args.n)]
+    fails = 0
+
+    # parse: kolom object (campur None) dan kolom string murni
+    fails += check("parse_price_idr_series", parse_price_idr_series(pd.Series(strs, dtype=object)),
+                   [parse_price_idr(s) for s in strs], strs)
+    only_str = [s for s in strs if s is not None]
+    fails += check("parse_price_idr_series[str]", parse_price_idr_series(pd.Series(only_str)),
+                   [parse_price_idr(s) for s in only_str], only_str)
+
+    # format: kolom float64, int64, dan object (campur teks tak valid)
+    fails += check("format_price_idr_series[float]", format_price_idr_series(pd.Series(nums, dtype="float64")),
+                   [format_price_idr(x) for x in pd.Series(nums, dtype="float64")], nums)
+    ints = [rng.randint(-10 ** 15, 10 ** 15) for _ in range(args.n)]
+    fails += check("format_price_idr_series[int]", format_price_idr_series(pd.Series(ints, dtype="int64")),
+                   [format_price_idr(x) for x in ints], ints)
+    mixed = nums + ["abc", "12.5", "1e3", "", None]
+    fails += check("format_price_idr_series[object]", format_price_idr_series(pd.Series(mixed, dtype=object)),
+                   [format_price_idr(x) for x in mixed], mixed)
+
+    # display: pasangan (price_str, price_num); price_num numerik/None/NaN seperti di katalog
+    m = min(len(strs), len(nums))
+    ps, pn = strs[:m], nums[:m]
+    rng.shuffle(ps)
+    pairs = list(zip(ps, pn))
+    fails += check("display_price_series", display_price_series(pd.Series(ps, dtype=object), pd.Series(pn, dtype=object)),
+                   [display_price(a, b) for a, b in pairs], pairs)
+    fails += check("display_price_series[float]", display_price_series(pd.Series(ps, dtype=object), pd.Series(pn, dtype="float64")),
+                   [display_price(a, b) for a, b in zip(ps, pd.Series(pn, dtype="float64"))], pairs)
+
+    if fails:
+        sys.exit(1)
+    print("Semua cocok.")
+
+if __name__ == "__main__":
+    main()
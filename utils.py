@@ -1,7 +1,8 @@
-import os, re, bcrypt, pandas as pd
+import os, re, bcrypt, numpy as np, pandas as pd
 from pandas.api.types import is_numeric_dtype
+from sqlalchemy import select, func, update, case, insert
 from sqlalchemy.orm import Session
-from models import Place
+from models import Place, Rating, Bookmark, Comment, User
 
 def parse_price_idr(s):
     if s is None:
@@ -17,6 +18,25 @@ def parse_price_idr(s):
     digits = re.sub(r"[^0-9]", "", t)
     return float(int(digits) * mult) if digits else 0.0
 
+_PRICE_FREE_RE = r"gratis|free|donasi"
+_PRICE_JUTA_RE = r"jt|juta"
+_PRICE_RIBU_RE = r"\b(?:k|rb|ribu)\b"
+
+def parse_price_idr_series(s: pd.Series) -> pd.Series:
+    """Versi vectorized parse_price_idr untuk satu kolom (hasil identik per elemen)."""
+    s = pd.Series(s)
+    t = s.astype(str).str.strip().str.lower()
+    zero = t.isin(["", "-", "n/a", "na"]) | t.str.contains(_PRICE_FREE_RE, regex=True)
+    mult = np.where(t.str.contains(_PRICE_JUTA_RE, regex=True), 1_000_000,
+                    np.where(t.str.contains(_PRICE_RIBU_RE, regex=True), 1_000, 1))
+    digits = t.str.replace(r"[^0-9]", "", regex=True)
+    out = pd.to_numeric(digits.where(digits != ""), errors="coerce").fillna(0.0) * mult
+    # angka sangat panjang (> presisi float64): pakai jalur int Python agar sama persis dengan versi skalar
+    long = digits.str.len() > 15
+    if long.any():
+        out[long] = [float(int(d) * int(m)) for d, m in zip(digits[long], mult[long.to_numpy()])]
+    return out.where(~zero, 0.0).astype("float64")
+
 def format_price_idr(n: float) -> str:
     try:
         val = int(round(float(n)))
@@ -33,6 +53,41 @@ def display_price(price_str, price_num):
         return f if f else "-"
     return "-"
 
+def _to_float_or_nan(x):
+    try:
+        return float(x)
+    except Exception:
+        return np.nan
+
+def format_price_idr_series(n: pd.Series) -> pd.Series:
+    """Versi vectorized format_price_idr (hasil identik per elemen; nilai tidak valid → "")."""
+    n = pd.Series(n)
+    v = n.astype("float64") if is_numeric_dtype(n) else n.map(_to_float_or_nan).astype("float64")
+    out = pd.Series("", index=n.index, dtype=object)
+    ok = np.isfinite(v.to_numpy())
+    # di luar jangkauan int64 → jalur skalar (int Python tak terbatas)
+    big = ok & (np.abs(v.to_numpy()) >= 2.0 ** 62)
+    fast = ok & ~big
+    if fast.any():
+        digits = pd.Series(np.rint(v.to_numpy()[fast]).astype(np.int64), index=n.index[fast]).astype(str)
+        out[fast] = "Rp" + digits.str.replace(r"(\d)(?=(?:\d{3})+$)", r"\1.", regex=True)
+    if big.any():
+        out[big] = [format_price_idr(x) for x in v[big]]
+    return out
+
+def display_price_series(price_str: pd.Series, price_num: pd.Series) -> pd.Series:
+    """Versi vectorized display_price untuk dua kolom sejajar (hasil identik per elemen)."""
+    ps = pd.Series(price_str, dtype=object)
+    pn = pd.Series(price_num, index=ps.index)
+    text = ps.map(str).str.strip()
+    use_str = ps.map(bool).astype(bool) & (text != "")
+    num = pn.astype("float64") if is_numeric_dtype(pn) else pn.map(_to_float_or_nan).astype("float64")
+    formatted = format_price_idr_series(num).replace("", "-")
+    out = pd.Series("-", index=ps.index, dtype=object)
+    out[num > 0] = formatted[num > 0]
+    out[use_str] = text[use_str]
+    return out
+
 def hash_password(pw: str) -> bytes:
     # kembalikan bytes (untuk kolom BYTEA / LargeBinary)
     return bcrypt.hashpw(pw.encode("utf-8"), bcrypt.gensalt())
@@ -91,6 +146,99 @@ def place_to_dict(p: Place, detail: bool = False):
         })
     return d
 
+def upsert_rating(sess: Session, user_id: int, place_id: int, rating: float, commit: bool = True) -> None:
+    """
+    Simpan rating user (insert/update) dan perbarui agregat Place (rating_count, rating_sum,
+    rating_avg) secara inkremental dalam transaksi yang sama — O(1), tanpa AVG/COUNT ulang.
+    commit=False: pemanggil yang commit (mis. banyak rating sekaligus dalam satu transaksi).
+    """
+    rating = float(rating)
+    row = sess.query(Rating).filter_by(user_id=user_id, place_id=place_id).first()
+    if row:
+        d_sum, d_cnt = rating - float(row.rating), 0
+        row.rating = rating
+    else:
+        d_sum, d_cnt = rating, 1
+        sess.add(Rating(user_id=user_id, place_id=place_id, rating=rating))
+    new_sum = func.coalesce(Place.rating_sum, 0.0) + d_sum
+    new_cnt = func.coalesce(Place.rating_count, 0) + d_cnt
+    sess.execute(
+        update(Place)
+        .where(Place.id == place_id)
+        .values(
+            rating_sum=new_sum,
+            rating_count=new_cnt,
+            rating_avg=case((new_cnt > 0, new_sum / new_cnt), else_=Place.rating_avg),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        sess.commit()
+
+def repair_rating_aggregates(sess: Session) -> int:
+    """Backfill/repair rating_count, rating_sum, rating_avg semua Place dari tabel ratings."""
+    agg = {
+        pid: (int(cnt or 0), float(total or 0.0))
+        for pid, cnt, total in sess.execute(
+            select(Rating.place_id, func.count(Rating.id), func.sum(Rating.rating)).group_by(Rating.place_id)
+        )
+    }
+    n = 0
+    for p in sess.scalars(select(Place)):
+        cnt, total = agg.get(p.id, (0, 0.0))
+        p.rating_count = cnt
+        p.rating_sum = total
+        if cnt:
+            p.rating_avg = total / cnt
+        n += 1
+    sess.commit()
+    return n
+
+def load_places_page(sess: Session, place_ids, user_id: int | None = None, with_comments: bool = True) -> dict:
+    """
+    Muat semua data kartu tempat untuk satu halaman sekaligus (beberapa query IN (...), bukan per kartu).
+    Return: {place_id: {"place", "price_text", "my_rating", "bookmarked", "rating_avg", "rating_count", "comments"}}
+    - comments: list (Comment, User) terbaru dulu; with_comments=False → query komentar dilewati (list kosong).
+    """
+    ids = list(dict.fromkeys(int(pid) for pid in place_ids))
+    if not ids:
+        return {}
+    out = {pid: {"place": None, "price_text": "-", "my_rating": None, "bookmarked": False,
+                 "rating_avg": 0.0, "rating_count": 0, "comments": []} for pid in ids}
+
+    places = list(sess.scalars(select(Place).where(Place.id.in_(ids))))
+    prices = display_price_series([p.price_str for p in places], [p.price_num for p in places])
+    for p, price_text in zip(places, prices):
+        out[p.id]["place"] = p
+        out[p.id]["price_text"] = price_text
+        out[p.id]["rating_count"] = int(p.rating_count or 0)
+        out[p.id]["rating_avg"] = float(p.rating_sum or 0.0) / p.rating_count if p.rating_count else 0.0
+
+    if user_id is not None:
+        mine = sess.execute(
+            select(Rating.place_id, Rating.rating)
+            .where(Rating.user_id == user_id, Rating.place_id.in_(ids))
+        )
+        for pid, r in mine:
+            out[pid]["my_rating"] = float(r)
+        marked = sess.scalars(
+            select(Bookmark.place_id).where(Bookmark.user_id == user_id, Bookmark.place_id.in_(ids))
+        )
+        for pid in marked:
+            out[pid]["bookmarked"] = True
+
+    if not with_comments:
+        return out
+    comments = sess.execute(
+        select(Comment, User)
+        .join(User, Comment.user_id == User.id)
+        .where(Comment.place_id.in_(ids))
+        .order_by(Comment.created_at.desc())
+    )
+    for c, user in comments:
+        out[c.place_id]["comments"].append((c, user))
+    return out
+
 def _find_places_csv():
     base = os.getcwd()
     candidates = [
@@ -112,7 +260,7 @@ def _resolve_price_columns(df: pd.DataFrame):
     if looks_like_eco:
         s = df["price"].fillna("").astype(str)
         price_str = s
-        price_num = s.apply(parse_price_idr)
+        price_num = parse_price_idr_series(s)
         return price_str, price_num
     used_num = False
     for c in num_candidates:
@@ -134,59 +282,83 @@ def _resolve_price_columns(df: pd.DataFrame):
     if chosen_str:
         price_str = df[chosen_str].fillna("").astype(str)
     price_str = price_str.where(price_str.str.strip() != "",
-                                price_num.apply(lambda x: format_price_idr(x) if float(x) > 0 else ""))
+                                format_price_idr_series(price_num).where(price_num > 0, ""))
     return price_str.astype(str), pd.to_numeric(price_num, errors="coerce").fillna(0.0)
 
-def seed_places_if_empty(sess: Session):
-    if sess.query(Place).first():
-        return
-    import pandas as pd
-    csv_path = _find_places_csv()
-    if not csv_path:
-        print("[seed] CSV tidak ditemukan. Lewati seeding.")
-        return
-    print(f"[seed] menggunakan {csv_path}")
+_SEED_COLMAP = {"place_id":"id","place_name":"place_name","place_description":"place_description","category":"category",
+                "city":"city","description_location":"address","address":"address","place_img":"image","image":"image",
+                "gallery_photo_img1":"gallery1","gallery_photo_img2":"gallery2","gallery_photo_img3":"gallery3",
+                "place_map":"map_url","map_url":"map_url","rating":"rating","rating_avg":"rating_avg",
+                "price":"price","harga":"price","ticket_price":"price","price_idr":"price","price_str":"price_str","price_num":"price_num"}
+_SEED_TEXT_COLS = ["place_name","place_description","category","city","address","image","gallery1","gallery2","gallery3","map_url"]
+
+def _places_frame_from_csv(csv_path: str) -> pd.DataFrame:
+    """Normalisasi CSV tempat → DataFrame dengan kolom persis seperti tabel places (sekali jalan, vectorized)."""
     df = pd.read_csv(csv_path)
-    colmap = {"place_id":"id","place_name":"place_name","place_description":"place_description","category":"category",
-              "city":"city","description_location":"address","address":"address","place_img":"image","image":"image",
-              "gallery_photo_img1":"gallery1","gallery_photo_img2":"gallery2","gallery_photo_img3":"gallery3",
-              "place_map":"map_url","map_url":"map_url","rating":"rating","rating_avg":"rating_avg",
-              "price":"price","harga":"price","ticket_price":"price","price_idr":"price","price_str":"price_str","price_num":"price_num"}
-    for c in list(df.columns):
-        if c in colmap:
-            df = df.rename(columns={c: colmap[c]})
+    df = df.rename(columns={c: _SEED_COLMAP[c] for c in df.columns if c in _SEED_COLMAP})
     if "id" not in df.columns:
         if "Unnamed: 0" in df.columns:
             df = df.rename(columns={"Unnamed: 0": "id"})
         else:
             raise KeyError("CSV tidak memiliki kolom id.")
-    df["id"] = pd.to_numeric(df["id"], errors="coerce").dropna().astype(int)
+    df["id"] = pd.to_numeric(df["id"], errors="coerce")
+    df = df.dropna(subset=["id"]).drop_duplicates(subset="id").reset_index(drop=True)
+    df["id"] = df["id"].astype(int)
     if "rating_avg" not in df.columns and "rating" in df.columns:
         df["rating_avg"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0.0)
     else:
         df["rating_avg"] = pd.to_numeric(df.get("rating_avg", 0.0), errors="coerce").fillna(0.0)
     price_str_ser, price_num_ser = _resolve_price_columns(df)
-    for col in ["place_name","place_description","category","city","address","image","gallery1","gallery2","gallery3","map_url"]:
-        if col not in df.columns:
-            df[col] = ""
-    rows = []
-    for idx, r in df.iterrows():
-        p = Place(
-            id=int(r["id"]),
-            place_name=str(r.get("place_name","") or ""),
-            place_description=str(r.get("place_description","") or ""),
-            category=str(r.get("category","") or ""),
-            city=str(r.get("city","") or ""),
-            address=str(r.get("address","") or ""),
-            price_num=float(price_num_ser.loc[idx] if idx in price_num_ser.index else 0.0),
-            price_str=str(price_str_ser.loc[idx] if idx in price_str_ser.index else ""),
-            rating_avg=float(r.get("rating_avg", 0.0) or 0.0),
-            image=str(r.get("image","") or ""),
-            gallery1=str(r.get("gallery1","") or ""),
-            gallery2=str(r.get("gallery2","") or ""),
-            gallery3=str(r.get("gallery3","") or ""),
-            map_url=str(r.get("map_url","") or ""),
-        )
-        rows.append(p)
-    sess.add_all(rows)
+
+    out = pd.DataFrame({"id": df["id"].to_numpy()})
+    for col in _SEED_TEXT_COLS:
+        out[col] = df[col].fillna("").astype(str).to_numpy() if col in df.columns else ""
+    out["price_num"] = price_num_ser.astype(float).to_numpy()
+    out["price_str"] = price_str_ser.astype(str).to_numpy()
+    out["rating_avg"] = df["rating_avg"].astype(float).to_numpy()
+    return out
+
+def _upsert_stmt(dialect_name: str):
+    """INSERT ... ON CONFLICT (id) DO UPDATE untuk kolom katalog (agregat rating tidak disentuh)."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(Place)
+    cols = _SEED_TEXT_COLS + ["price_num", "price_str"]
+    return stmt.on_conflict_do_update(index_elements=[Place.id], set_={c: stmt.excluded[c] for c in cols})
+
+def seed_places(sess: Session, csv_path: str | None = None, upsert: bool = False, chunk_size: int = 1000) -> int:
+    """
+    Seeding bulk tabel places dari CSV: normalisasi kolom & parsing harga vectorized,
+    lalu INSERT executemany per chunk. upsert=True → sinkron ulang CSV tanpa truncate
+    (kolom katalog diperbarui; rating_avg/rating_count/rating_sum milik app dipertahankan).
+    Return jumlah baris yang ditulis.
+    """
+    csv_path = csv_path or _find_places_csv()
+    if not csv_path:
+        print("[seed] CSV tidak ditemukan. Lewati seeding.")
+        return 0
+    print(f"[seed] menggunakan {csv_path}")
+    df = _places_frame_from_csv(csv_path)
+    records = df.to_dict("records")
+
+    stmt = insert(Place)
+    if upsert:
+        stmt = _upsert_stmt(sess.get_bind().dialect.name)
+        if stmt is None:
+            # dialek lain: buang id yang sudah ada lalu insert sisanya
+            have = set(sess.scalars(select(Place.id)))
+            records = [r for r in records if r["id"] not in have]
+            stmt = insert(Place)
+    for i in range(0, len(records), chunk_size):
+        sess.execute(stmt, records[i:i + chunk_size])
     sess.commit()
+    return len(records)
+
+def seed_places_if_empty(sess: Session):
+    if sess.query(Place).first():
+        return
+    seed_places(sess)